@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# Collision - A ball dodging game
+# Copyright (C) 2016 Bruno Nova <brunomb.nova@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Compares the broadphases used to find the enemy balls that collide.
+
+For each number of balls, the balls move and bounce off the walls for some
+frames, and the time to find the overlapping pairs with the grid (SpatialHash)
+and with the sweep and prune (SweepAndPrune) is measured. The arena grows with
+the number of balls, so the density is similar to a long game.
+"""
+
+# Add parent directory to path to allow this script to run from the project folder
+import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import math, random, time
+from argparse import ArgumentParser
+
+from collision.bodies import Arena, Body, Category, EnemyBody
+from collision.spatial import SpatialHash, SweepAndPrune
+
+AREA_PER_BALL = 60 * 60  # area of the arena per ball
+
+
+def createBalls(count, size, seed):
+	"""Creates enabled enemy balls with random positions and directions."""
+	rng = random.Random(seed)
+	balls = []
+	for i in range(count):
+		x = rng.uniform(Body.RADIUS, size - Body.RADIUS)
+		y = rng.uniform(Body.RADIUS, size - Body.RADIUS)
+		ball = EnemyBody(x, y, 300, rng)
+		ball.updateEnableTime(ball.enableTime)  # enable it now
+		balls.append(ball)
+	return balls
+
+def run(broadphase, count, frames, seed):
+	"""
+	Runs the benchmark of a broadphase.
+
+	@param broadphase: "grid" or "sap".
+	@param count: number of balls.
+	@param frames: number of frames to simulate.
+	@param seed: seed of the random positions and directions.
+	@return: tuple (seconds per frame, pairs found per frame).
+	"""
+	size = math.sqrt(count * AREA_PER_BALL)
+	arena = Arena(size, size)
+	balls = createBalls(count, size, seed)
+	if broadphase == "grid":
+		index = SpatialHash(2 * Body.RADIUS)
+		for ball in balls:
+			index.add(ball)
+		index.retune(size, size)
+	else:
+		index = SweepAndPrune()
+		for ball in balls:
+			index.add(ball)
+
+	elapsed = 0
+	pairs = 0
+	for frame in range(frames):
+		for ball in balls:
+			ball.update(1 / 60, 1, arena)
+
+		start = time.perf_counter()
+		for ball in balls:
+			index.move(ball)
+		pairs += len(index.pairs(Category.ENEMY))
+		elapsed += time.perf_counter() - start
+	return elapsed / frames, pairs / frames
+
+def main():
+	parser = ArgumentParser(description="Compares the grid and sweep and prune broadphases")
+	parser.add_argument("-f", "--frames", type=int, default=200,
+	                    help="number of frames to simulate (default: 200)")
+	parser.add_argument("-s", "--seed", type=int, default=1,
+	                    help="random seed (default: 1)")
+	parser.add_argument("counts", type=int, nargs="*", default=[10, 100, 1000],
+	                    help="numbers of balls (default: 10 100 1000)")
+	args = parser.parse_args()
+
+	print("{:>6} {:>12} {:>12} {:>8}".format("balls", "grid (ms)", "sap (ms)", "pairs"))
+	for count in args.counts:
+		grid, pairs = run("grid", count, args.frames, args.seed)
+		sap, sapPairs = run("sap", count, args.frames, args.seed)
+		assert pairs == sapPairs, "the broadphases found different pairs"
+		print("{:>6} {:>12.3f} {:>12.3f} {:>8.1f}".format(count, grid * 1000,
+		                                                  sap * 1000, pairs))
+
+
+if __name__ == "__main__":
+	main()
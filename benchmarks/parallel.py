@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# Collision - A ball dodging game
+# Copyright (C) 2016 Bruno Nova <brunomb.nova@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Compares the parallel store of enemy balls with the NumPy store.
+
+For each number of balls, the same balls are moved and bounced by both stores,
+and after each step the largest difference between their positions is
+measured. Before the next step, the parallel store gets the state of the NumPy
+store again, so each difference is the error of a single step (the balls are
+chaotic, so a tiny error would grow over the steps). The script fails if an
+error is above TOLERANCE. The time per step of each store is also shown.
+"""
+
+# Add parent directory to path to allow this script to run from the project folder
+import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import math, random, time
+from argparse import ArgumentParser
+
+from collision.bodies import Arena, Body
+from collision.enemies import NumpyEnemyStore
+from collision.parallel import ParallelEnemyStore
+
+AREA_PER_BALL = 50 * 50  # area of the arena per ball (crowded, so many balls bounce)
+SPEED = 300  # speed of the balls
+TOLERANCE = 1e-9  # largest difference of a position after a step (pixels)
+
+
+def createStores(count, workers, seed):
+	"""Creates both stores with the same enabled balls."""
+	size = math.sqrt(count * AREA_PER_BALL)
+	stores = NumpyEnemyStore(), ParallelEnemyStore(workers)
+	rng = random.Random(seed)
+	for i in range(count):
+		x = rng.uniform(Body.RADIUS, size - Body.RADIUS)
+		y = rng.uniform(Body.RADIUS, size - Body.RADIUS)
+		angle = rng.uniform(0, 2 * math.pi)
+		for store in stores:  # enabled now, with the same direction in both stores
+			store.add(x, y, SPEED)
+			store.speedX[-1], store.speedY[-1] = math.cos(angle) * SPEED, math.sin(angle) * SPEED
+			store.enableTime[-1] = 0
+			store.enabled[-1] = True
+	return Arena(size, size), stores
+
+def step(store, arena):
+	"""Moves and bounces the balls of a store, and returns the seconds it took."""
+	start = time.perf_counter()
+	store.savePositions()
+	store.update(1 / 60, 1, arena)
+	store.bounceBalls(arena)
+	return time.perf_counter() - start
+
+def run(count, frames, workers, seed):
+	"""
+	Runs the comparison with a number of balls.
+
+	@return: tuple (largest error of a step, seconds per step of the NumPy
+	         store, seconds per step of the parallel store).
+	"""
+	arena, (single, parallel) = createStores(count, workers, seed)
+	error = numpyTime = parallelTime = 0
+	try:
+		for frame in range(frames):
+			numpyTime += step(single, arena)
+			parallelTime += step(parallel, arena)
+			error = max(error, abs(single.x - parallel.x).max(),
+			            abs(single.y - parallel.y).max())
+			for column in "x", "y", "speedX", "speedY":
+				getattr(parallel, column)[:] = getattr(single, column)
+	finally:
+		parallel.close()
+	return error, numpyTime / frames, parallelTime / frames
+
+def main():
+	parser = ArgumentParser(description="Compares the parallel and NumPy enemy stores")
+	parser.add_argument("-f", "--frames", type=int, default=100,
+	                    help="number of steps compared (default: 100)")
+	parser.add_argument("-w", "--workers", type=int, default=4,
+	                    help="worker processes of the parallel store (default: 4)")
+	parser.add_argument("-s", "--seed", type=int, default=1,
+	                    help="random seed (default: 1)")
+	parser.add_argument("counts", type=int, nargs="*", default=[600, 3000, 10000],
+	                    help="numbers of balls (default: 600 3000 10000)")
+	args = parser.parse_args()
+	ParallelEnemyStore.MIN_BALLS = 0  # always use the workers
+
+	print("{:>6} {:>12} {:>12} {:>14}".format("balls", "numpy (ms)", "parallel (ms)",
+	                                          "largest error"))
+	failed = False
+	for count in args.counts:
+		error, numpyTime, parallelTime = run(count, args.frames, args.workers, args.seed)
+		failed = failed or error > TOLERANCE
+		print("{:>6} {:>12.3f} {:>12.3f} {:>14.3g}".format(count, numpyTime * 1000,
+		                                                   parallelTime * 1000, error))
+	if failed:
+		sys.exit("The error of a step was above the tolerance ({} pixels)".format(TOLERANCE))
+
+
+if __name__ == "__main__":
+	main()
@@ -14,23 +14,26 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import math, random, pyglet
+import math, pyglet
 from cocos.actions import CallFunc, FadeIn, FadeOut
-from cocos.collision_model import CircleShape
-from cocos.director import director
-from cocos.euclid import Vector2
 from cocos.sprite import Sprite
-from pyglet import window
 
-from . import util
+from . import resources
+from .bodies import Body
 
-__all__ = ["Player", "Enemy", "Coin", "Bonus", "Missile"]
+__all__ = ["Player", "Enemy", "Coin", "Bonus", "Missile", "BallPool", "ballPool"]
 
 
 class Ball(Sprite):
-	"""Base class for player and enemy balls."""
+	"""
+	Base class for the sprites of the player and enemy balls.
 
-	def __init__(self, image, *args, **kwargs):
+	A ball only draws a Body of the game engine, which holds the actual state.
+	The sprites are reused by a BallPool, so the state of a new ball is set by
+	reset(), not by the constructor.
+	"""
+
+	def __init__(self, image, body: Body, *args, **kwargs):
 		super().__init__(image, *args, **kwargs)
 
 		# Determine if the image is a simple image or an Animation
@@ -39,317 +42,219 @@ class Ball(Sprite):
 		else:
 			realImage = self.image  # it's an image
 
-		self.radius = realImage.width // 2  # radius of the ball
-		self.image_anchor = self.radius, self.radius
-		self.cshape = CircleShape(Vector2(self.x, self.y), self.radius)
+		radius = realImage.width // 2
+		self.image_anchor = radius, radius
+		self.reset(body)
 
-	def ensureWithinBorders(self):
+	def reset(self, body: Body):
 		"""
-		Checks if the ball is inside the window, moving it if it's not.
+		Makes the sprite draw a new body, as if it was just created.
 
-		The cshape is also updated.
+		@param body: the body.
 		"""
-		width, height = director.get_window_size()
-		self.x = min(max(self.x, self.radius), width - self.radius)
-		self.y = min(max(self.y, self.radius), height - self.radius)
-		self.cshape.center = Vector2(self.x, self.y)
+		self.body = body
+		self.stop()
+		self.sync()
+
+	def detach(self):
+		"""Removes the sprite from its parent (to be reused)."""
+		self.stop()
+		if self.parent is not None:
+			self.parent.remove(self)
+			self.parent = None
 
-	def setRandomPosition(self, playerX, playerY, minPlayerDistance):
+	def sync(self, alpha=1):
 		"""
-		Moves the ball to a random position.
+		Moves the sprite to the position of the body.
 
-		@param playerX: x position of the player.
-		@param playerY: y position of the player.
-		@param minPlayerDistance: minimum distance from the player when created.
+		@param alpha: where the sprite is drawn between the previous (0) and
+		              the current (1) position of the body.
 		"""
-		while True:
-			width, height = director.get_window_size()
-			x = random.randint(self.radius, width - self.radius)
-			y = random.randint(self.radius, height - self.radius)
-			if util.distance(x, y, playerX, playerY) >= minPlayerDistance:
-				break
-		self.position = x, y
-		self.cshape.center = Vector2(x, y)
+		self.position = self.body.interpolate(alpha)
 
 
 class Player(Ball):
 	"""The player ball."""
-	SPEED = 400  # movement speed with the keyboard
 
-	def __init__(self, x, y):
+	def __init__(self, body):
 		"""
 		Creates the player ball.
 
-		@param x: initial x position of the ball.
-		@param y: initial y position of the ball.
+		@param body: the PlayerBody drawn by the sprite.
 		"""
-		super().__init__("player.png")
-		self.position = x, y  # WARNING: position is a tuple, not a vector!
-		self.cshape.center = Vector2(x, y)  # the center must be a Vector2!
+		# Not a child of the player (the children of a sprite in a batch don't
+		# move with it), so it's moved by sync() and added by the layer
+		self.invulnerableSprite = Sprite(resources.image("player_invulnerable.png"), opacity=0)
+		super().__init__(resources.image("player.png"), body)
+
+	def reset(self, body):
+		super().reset(body)
+		self.opacity = 255  # faded out at the end of the previous game
+		self.unfreeze()
+		self.invulnerableSprite.stop()
+		self.invulnerableSprite.opacity = 0
+
+	def detach(self):
+		super().detach()
+		self.invulnerableSprite.stop()
+		if self.invulnerableSprite.parent is not None:
+			self.invulnerableSprite.parent.remove(self.invulnerableSprite)
+			self.invulnerableSprite.parent = None
 
-		self._frozen = False
-		self._invulnerable = False
-		self.invulnerableSprite = Sprite("player_invulnerable.png", opacity=0)
-		self.add(self.invulnerableSprite, z=0.8)
+	def sync(self, alpha=1):
+		super().sync(alpha)
+		self.invulnerableSprite.position = self.position
 
 	def freeze(self):
-		"""Freezes the ball."""
-		self.image = pyglet.resource.image("player_frozen.png")
-		self._frozen = True
+		"""Shows the ball as frozen."""
+		self.image = resources.image("player_frozen.png")
 
 	def unfreeze(self):
-		"""Unfreezes the ball."""
-		self._frozen = False
-		self.image = pyglet.resource.image("player.png")
-
-	def isFrozen(self):
-		"""Returns whether the ball is frozen."""
-		return self._frozen
+		"""Shows the ball as not frozen."""
+		self.image = resources.image("player.png")
 
 	def makeInvulnerable(self):
-		"""Makes the ball invulnerable."""
+		"""Shows the ball as invulnerable."""
 		self.invulnerableSprite.stop()
-		self._invulnerable = True
 		self.invulnerableSprite.opacity = 255
 
 	def makeVulnerable(self):
-		"""Makes the ball vulnerable after an animation."""
-		if self.isInvulnerable():
-			self.invulnerableSprite.stop()
-			actions = FadeOut(0.2) + (FadeIn(0.2) + FadeOut(0.2)) * 4 + \
-			          CallFunc(self._makeVulnerable)
-			self.invulnerableSprite.do(actions)
-
-	def isInvulnerable(self):
-		"""Returns whether the ball is invulnerable."""
-		return self._invulnerable
-
-	def update(self, dt, mouseDelta: Vector2, keysPressed):
-		# Move player according to mouse/keyboard
-		if not self.isFrozen():
-			self.position += mouseDelta
-			self.position += Player._keyboardDelta(keysPressed) * Player.SPEED * dt
-			self.ensureWithinBorders()  # check borders
+		"""Shows the ball becoming vulnerable (takes PlayerBody.VULNERABLE_DELAY)."""
+		self.invulnerableSprite.stop()
+		actions = FadeOut(0.2) + (FadeIn(0.2) + FadeOut(0.2)) * 4 + \
+		          CallFunc(self._makeVulnerable)
+		self.invulnerableSprite.do(actions)
 
 	def _makeVulnerable(self):
 		self.invulnerableSprite.opacity = 0
-		self._invulnerable = False
-
-	@staticmethod
-	def _keyboardDelta(keysPressed):
-		"""
-		Returns a vector that points to the direction the arrow keys are pressed.
-
-		Each coordinate of the vector will have the value -1, 0 or 1.
-
-		@param keysPressed: the keys currently held down.
-		@return: direction of the arraw keys pressed in the keyboard.
-		"""
-		delta = Vector2(0, 0)
-
-		if window.key.LEFT in keysPressed:
-			delta.x -= 1
-		if window.key.RIGHT in keysPressed:
-			delta.x += 1
-		if window.key.UP in keysPressed:
-			delta.y += 1
-		if window.key.DOWN in keysPressed:
-			delta.y -= 1
-
-		return delta
 
 
 class Enemy(Ball):
 	"""An enemy ball."""
-	PLAYER_DISTANCE = 100  # minimum distance from the player when created
-	MASS = 1  # mass of the ball (used when balls collide)
 
-	def __init__(self, playerX, playerY, initial_speed):
+	def __init__(self, body):
 		"""
-		Creates an enemy ball with a random position.
+		Creates an enemy ball, fading it in.
 
-		@param playerX: x position of the player ball.
-		@param playerY: y position of the player ball.
-		@param initial_speed: initial speed of the ball.
-		"""
-		super().__init__("enemy.png")
-		self._initialSpeed = initial_speed
-		self.setRandomPosition(playerX, playerY, Enemy.PLAYER_DISTANCE)
-		self.speed = Vector2(0, 0)
-		self.mass = Enemy.MASS
-		self.enabled = False  # whether the ball is moving and is collidable
-		self.opacity = 0
-		self.do(FadeIn(1) + CallFunc(self._enable))
-
-	def update(self, dt, factor):
-		if self.enabled:
-			# Move ball
-			self.position += self.speed * dt * factor
-
-			# Check borders
-			width, height = director.get_window_size()
-			if self.x < self.radius or self.x > width - self.radius:
-				self.speed.x = -self.speed.x
-			if self.y < self.radius or self.y > height - self.radius:
-				self.speed.y = -self.speed.y
-			self.ensureWithinBorders()
-
-	@staticmethod
-	def bounceBalls(b1: "Enemy", b2: "Enemy"):
+		@param body: the EnemyBody drawn by the sprite.
 		"""
-		Bounces two balls off one another after a collision.
-
-		@param b1: the 1st ball.
-		@param b2: the 2nd ball.
-		"""
-		p1 = Vector2(b1.x, b1.y)
-		p2 = Vector2(b2.x, b2.y)
-		delta = p1 - p2
-		dist = delta.magnitude()
-
-		if dist == 0:  # prevent a possible division by zero
-			dist = b1.radius + b2.radius - 1
-			delta = Vector2(b1.radius + b2.radius, 0)
-
-		# Minimum Translation Distance to push balls apart after the collision
-		mtd = delta * ((b1.radius + b2.radius - dist) / dist)
-
-		# Inverse mass quantities
-		im1, im2 = 1 / b1.mass, 1 / b2.mass
-
-		# Push-pull them apart
-		b1.position += mtd * (im1 / (im1 + im2))
-		b2.position -= mtd * (im2 / (im1 + im2))
-
-		# Ensure the balls are still inside the window
-		b1.ensureWithinBorders()
-		b2.ensureWithinBorders()
-
-		# Impact speed
-		v = b1.speed - b2.speed
-		vn = v.dot(mtd.normalize())
-
-		# Sphere intersecting but moving away from each other already
-		if vn > 0:
-			return
-
-		# Collision impulse
-		restitution = 1
-		i = (-(1 + restitution) * vn) / (im1 + im2)
-		impulse = mtd * i
+		super().__init__(resources.image("enemy.png"), body)
 
-		# Change in momentum
-		b1.speed += impulse * im1
-		b2.speed -= impulse * im2
-
-	def _enable(self):
-		self._setRandomDirection()
-		self.enabled = True
-
-	def _setRandomDirection(self):
-		self.speed = util.vectorFromAngle(random.random() * math.pi * 2, self._initialSpeed)
+	def reset(self, body):
+		super().reset(body)
+		self.opacity = 0
+		self.do(FadeIn(body.ENABLE_DELAY))
 
 
 class Coin(Ball):
 	"""A coin, used when the type of game is "Coins"."""
-	PLAYER_DISTANCE = 200  # minimum distance from the player when created
 
-	def __init__(self, playerX, playerY):
+	def __init__(self, body):
 		"""
-		Creates a coin with a random position.
+		Creates a coin, fading it in.
 
-		@param playerX: x position of the player ball.
-		@param playerY: y position of the player ball.
+		@param body: the CoinBody drawn by the sprite.
 		"""
-		super().__init__(Coin._loadAnimation())
-		self.setRandomPosition(playerX, playerY, Coin.PLAYER_DISTANCE)
-		self.enabled = False  # whether the coin can be caught
-		self.opacity = 0
-		self.do(FadeIn(1) + CallFunc(self._enable))
+		super().__init__(resources.coinAnimation(), body)
 
-	def _enable(self):
-		self.enabled = True
-
-	@staticmethod
-	def _loadAnimation():
-		sheet = pyglet.resource.image("coin.png")
-		grid = pyglet.image.ImageGrid(sheet, 1, 61)
-		textures = pyglet.image.TextureGrid(grid)
-		return pyglet.image.Animation.from_image_sequence(textures, 0.02)
+	def reset(self, body):
+		super().reset(body)
+		self.opacity = 0
+		self.do(FadeIn(body.ENABLE_DELAY))
 
 
 class Bonus(Ball):
 	"""A bonus that gives the player an advantage or a disadvantage when caught."""
-	PLAYER_DISTANCE = 200  # minimum distance from the player when created
 
-	def __init__(self):
-		"""Creates a bonus (disabled and hidden)."""
-		super().__init__("bonus.png")
-		self.enabled = False  # whether the bonus can be caught
-		self.opacity = 0
-
-	def show(self, playerX, playerY):
+	def __init__(self, body):
 		"""
-		Shows the bonus and enables it.
+		Creates a bonus (hidden).
 
-		@param playerX: x position of the player ball.
-		@param playerY: y position of the player ball.
+		@param body: the BonusBody drawn by the sprite.
 		"""
-		if not self.enabled:
-			self.setRandomPosition(playerX, playerY, Bonus.PLAYER_DISTANCE)
-			self.enabled = True
-			self.opacity = 0
-			self.do(FadeIn(0.5))
+		super().__init__(resources.image("bonus.png"), body)
+
+	def reset(self, body):
+		super().reset(body)
+		self.opacity = 0
+
+	def show(self):
+		"""Shows the bonus."""
+		self.sync()
+		self.opacity = 0
+		self.do(FadeIn(0.5))
 
 	def hide(self):
-		"""Hides the bonus and disables it."""
-		self.enabled = False
+		"""Hides the bonus."""
 		self.opacity = 0
 		self.stop()
 
 
 class Missile(Ball):
 	"""A homing-missile that tries to hit the player."""
-	PLAYER_DISTANCE = 200  # minimum distance from the player when created
-	SPEED = 200  # speed of the missile
 
-	def __init__(self):
-		"""Creates a bonus (disabled and hidden)."""
-		super().__init__("missile.png")
-		self.enabled = False  # whether the missile moves and is collidable
-		self.opacity = 0
-		self.direction = 0
-
-	def show(self, playerX, playerY):
+	def __init__(self, body):
 		"""
-		Shows the missile and enables it.
+		Creates a missile (hidden).
 
-		@param playerX: x position of the player ball.
-		@param playerY: y position of the player ball.
+		@param body: the MissileBody drawn by the sprite.
 		"""
-		if not self.enabled:
-			self.setRandomPosition(playerX, playerY, Missile.PLAYER_DISTANCE)
-			self.direction = self._getPlayerDirection(playerX, playerY)
-			self.do(FadeIn(0.5) + CallFunc(self._enable))
+		super().__init__(resources.image("missile.png"), body)
+
+	def reset(self, body):
+		super().reset(body)
+		self.opacity = 0
+
+	def sync(self, alpha=1):
+		super().sync(alpha)
+		self.rotation = -math.degrees(self.body.direction)  # rotation is in degrees!
+
+	def show(self):
+		"""Shows the missile."""
+		self.sync()
+		self.do(FadeIn(self.body.ENABLE_DELAY))
 
 	def hide(self):
-		"""Hides the missile and disables it."""
-		self.enabled = False
+		"""Hides the missile."""
 		self.opacity = 0
 		self.stop()
 
-	def update(self, dt, playerX, playerY):
-		# The missile needs to be rotated when fading in (not enabled yet)
-		self.direction = self._getPlayerDirection(playerX, playerY)
-		self.rotation = -math.degrees(self.direction)  # rotation is in degrees!
 
-		if self.enabled:
-			speed = util.vectorFromAngle(self.direction, Missile.SPEED * dt)
-			self.position += speed
-			self.cshape.center = Vector2(self.x, self.y)
+class BallPool:
+	"""
+	Keeps the sprites of the balls to reuse them in the next games.
+
+	Only one game runs at a time, so all the sprites given by the pool are
+	taken back when the next game starts, by recycle().
+	"""
+
+	def __init__(self):
+		self._free = {}  # class of the sprites -> list of unused sprites
+		self._used = []  # sprites given since the last recycle()
+
+	def acquire(self, cls, body):
+		"""
+		Gets a sprite for a body, reusing a free sprite if possible.
+
+		@param cls: class of the sprite (Player, Enemy, Coin, Bonus or Missile).
+		@param body: the body drawn by the sprite.
+		@return: the sprite (not added to any node).
+		"""
+		free = self._free.get(cls)
+		if free:
+			sprite = free.pop()
+			sprite.reset(body)
+		else:
+			sprite = cls(body)
+		self._used.append(sprite)
+		return sprite
+
+	def recycle(self):
+		"""Takes back all the sprites given, removing them from their parents."""
+		for sprite in self._used:
+			sprite.detach()
+			self._free.setdefault(type(sprite), []).append(sprite)
+		self._used.clear()
 
-	def _enable(self):
-		self.enabled = True
 
-	def _getPlayerDirection(self, playerX, playerY):
-		return math.atan2(playerY - self.y, playerX - self.x)
+ballPool = BallPool()  # pool used by the games
@@ -0,0 +1,313 @@
+# Collision - A ball dodging game
+# Copyright (C) 2016 Bruno Nova <brunomb.nova@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+The balls simulated by the game engine.
+
+The balls are plain objects, without sprites, so they can be used without a
+window. The sprites in the balls module only draw them.
+"""
+
+import math, random
+
+from .kernels import bounce, homingStep, reflect
+
+__all__ = ["Category", "Arena", "Body", "PlayerBody", "EnemyBody", "CoinBody", "BonusBody",
+           "MissileBody"]
+
+
+class Category:
+	"""Categories of balls (flags that can be combined to filter collisions)."""
+	PLAYER = 1
+	ENEMY = 2
+	COIN = 4
+	BONUS = 8
+	MISSILE = 16
+	ALL = PLAYER | ENEMY | COIN | BONUS | MISSILE
+
+
+class Arena:
+	"""
+	The rectangle where the balls move.
+
+	The limits of the positions of the balls depend on their radius, so they're
+	computed once per radius.
+	"""
+
+	def __init__(self, width, height):
+		"""
+		Creates the arena.
+
+		@param width: width of the arena.
+		@param height: height of the arena.
+		"""
+		self.width = width
+		self.height = height
+		self._limits = {}  # radius -> limits of the positions
+
+	def limits(self, radius):
+		"""
+		Returns the limits of the positions of the balls with a radius.
+
+		@param radius: radius of the balls.
+		@return: tuple (minX, maxX, minY, maxY) with the limits of the centre
+		         of the balls.
+		"""
+		limits = self._limits.get(radius)
+		if limits is None:
+			limits = radius, self.width - radius, radius, self.height - radius
+			self._limits[radius] = limits
+		return limits
+
+
+class Body:
+	"""
+	Base class for the balls simulated by the engine.
+
+	The state of the balls is kept in __slots__ and changed in place, so
+	updating them doesn't allocate objects (besides Python floats).
+	"""
+	__slots__ = "x", "y", "prevX", "prevY", "radius", "enabled", "enableTime"
+	RADIUS = 16  # radius of the ball (half the width of the images)
+	CATEGORY = 0  # category of the ball (a Category flag)
+
+	def __init__(self, x=0, y=0):
+		"""
+		Creates the ball.
+
+		@param x: initial x position of the ball.
+		@param y: initial y position of the ball.
+		"""
+		self.x = x
+		self.y = y
+		self.prevX = x  # position before the last update (for interpolation)
+		self.prevY = y
+		self.radius = self.RADIUS
+		self.enabled = False  # whether the ball is collidable
+		self.enableTime = 0  # time left until the ball is enabled (0 = none)
+
+	def collidesWith(self, other):
+		"""Returns whether this ball overlaps the other ball."""
+		dx = self.x - other.x
+		dy = self.y - other.y
+		radii = self.radius + other.radius
+		return dx * dx + dy * dy < radii * radii
+
+	def savePosition(self):
+		"""Saves the current position as the previous one (before an update)."""
+		self.prevX = self.x
+		self.prevY = self.y
+
+	def interpolate(self, alpha):
+		"""
+		Returns a position between the previous and the current position.
+
+		@param alpha: 0 for the previous position, 1 for the current one.
+		@return: tuple (x, y) with the position.
+		"""
+		return self.prevX + (self.x - self.prevX) * alpha, \
+		       self.prevY + (self.y - self.prevY) * alpha
+
+	def ensureWithinBorders(self, arena):
+		"""
+		Checks if the ball is inside the arena, moving it if it's not.
+
+		@param arena: the Arena.
+		"""
+		minX, maxX, minY, maxY = arena.limits(self.radius)
+		self.x = min(max(self.x, minX), maxX)
+		self.y = min(max(self.y, minY), maxY)
+
+	def enableLater(self, delay):
+		"""
+		Enables the ball after some time (used while the ball fades in).
+
+		@param delay: seconds until the ball is enabled.
+		"""
+		self.enabled = False
+		self.enableTime = delay
+
+	def updateEnableTime(self, dt):
+		"""
+		Counts down the time until the ball is enabled.
+
+		@param dt: seconds passed since the last update.
+		@return: True if the ball was enabled in this update.
+		"""
+		if self.enableTime > 0:
+			self.enableTime -= dt
+			if self.enableTime <= 0:
+				self.enableTime = 0
+				self._enable()
+				return True
+		return False
+
+	def _enable(self):
+		self.enabled = True
+
+
+class PlayerBody(Body):
+	"""The player ball."""
+	__slots__ = "frozen", "invulnerable", "vulnerableTime"
+	CATEGORY = Category.PLAYER
+	SPEED = 400  # movement speed with the keyboard
+	VULNERABLE_DELAY = 1.8  # duration of the "becoming vulnerable" animation
+
+	def __init__(self, x, y):
+		super().__init__(x, y)
+		self.enabled = True
+		self.frozen = False
+		self.invulnerable = False
+		self.vulnerableTime = 0  # time left until the ball becomes vulnerable
+
+	def update(self, dt, dx, dy, keyX, keyY, arena):
+		"""
+		Moves the player according to the mouse and keyboard.
+
+		@param dt: seconds passed since the last update.
+		@param dx: mouse movement in x since the last update.
+		@param dy: mouse movement in y since the last update.
+		@param keyX: direction of the arrow keys in x (-1, 0 or 1).
+		@param keyY: direction of the arrow keys in y (-1, 0 or 1).
+		@param arena: the Arena.
+		"""
+		if self.vulnerableTime > 0:
+			self.vulnerableTime -= dt
+			if self.vulnerableTime <= 0:
+				self.vulnerableTime = 0
+				self.invulnerable = False
+
+		if not self.frozen:
+			self.x += dx + keyX * PlayerBody.SPEED * dt
+			self.y += dy + keyY * PlayerBody.SPEED * dt
+			self.ensureWithinBorders(arena)
+
+	def makeInvulnerable(self):
+		"""Makes the ball invulnerable."""
+		self.invulnerable = True
+		self.vulnerableTime = 0
+
+	def makeVulnerable(self):
+		"""Makes the ball vulnerable after the VULNERABLE_DELAY."""
+		if self.invulnerable:
+			self.vulnerableTime = PlayerBody.VULNERABLE_DELAY
+
+
+class EnemyBody(Body):
+	"""An enemy ball."""
+	__slots__ = "speedX", "speedY", "mass", "index", "_initialSpeed", "_rng"
+	CATEGORY = Category.ENEMY
+	PLAYER_DISTANCE = 100  # minimum distance from the player when created
+	MASS = 1  # mass of the ball (used when balls collide)
+	ENABLE_DELAY = 1  # duration of the fade in
+
+	def __init__(self, x, y, initialSpeed, rng=random):
+		"""
+		Creates an enemy ball, which is enabled after ENABLE_DELAY.
+
+		@param x: initial x position of the ball.
+		@param y: initial y position of the ball.
+		@param initialSpeed: initial speed of the ball.
+		@param rng: random number generator used to pick the direction.
+		"""
+		super().__init__(x, y)
+		self.speedX = 0.0
+		self.speedY = 0.0
+		self.mass = EnemyBody.MASS
+		self.index = 0  # position of the ball in its enemy store
+		self._initialSpeed = initialSpeed
+		self._rng = rng
+		self.enableLater(EnemyBody.ENABLE_DELAY)
+
+	def update(self, dt, factor, arena):
+		"""
+		Moves the ball, bouncing it off the borders of the arena.
+
+		@param dt: seconds passed since the last update.
+		@param factor: factor to multiply the speed by.
+		@param arena: the Arena.
+		"""
+		if self.enabled:
+			# Move ball and check borders
+			minX, maxX, minY, maxY = arena.limits(self.radius)
+			self.x, self.speedX = reflect(self.x + self.speedX * dt * factor,
+			                              self.speedX, minX, maxX)
+			self.y, self.speedY = reflect(self.y + self.speedY * dt * factor,
+			                              self.speedY, minY, maxY)
+
+	@staticmethod
+	def bounceBalls(b1, b2, arena):
+		"""
+		Bounces two balls off one another after a collision.
+
+		@param b1: the 1st ball.
+		@param b2: the 2nd ball.
+		@param arena: the Arena.
+		"""
+		b1.x, b1.y, b1.speedX, b1.speedY, b2.x, b2.y, b2.speedX, b2.speedY = \
+			bounce(b1.x, b1.y, b1.speedX, b1.speedY, b1.radius, b1.mass,
+			       b2.x, b2.y, b2.speedX, b2.speedY, b2.radius, b2.mass,
+			       arena.width, arena.height)
+
+	def _enable(self):
+		angle = self._rng.random() * math.pi * 2
+		self.speedX = math.cos(angle) * self._initialSpeed
+		self.speedY = math.sin(angle) * self._initialSpeed
+		self.enabled = True
+
+
+class CoinBody(Body):
+	"""A coin, used when the type of game is "Coins"."""
+	__slots__ = ()
+	CATEGORY = Category.COIN
+	PLAYER_DISTANCE = 200  # minimum distance from the player when created
+	ENABLE_DELAY = 1  # duration of the fade in
+
+	def __init__(self, x, y):
+		super().__init__(x, y)
+		self.enableLater(CoinBody.ENABLE_DELAY)
+
+
+class BonusBody(Body):
+	"""A bonus that gives the player an advantage or a disadvantage when caught."""
+	__slots__ = ()
+	CATEGORY = Category.BONUS
+	PLAYER_DISTANCE = 200  # minimum distance from the player when shown
+
+
+class MissileBody(Body):
+	"""A homing-missile that tries to hit the player."""
+	__slots__ = ("direction",)
+	CATEGORY = Category.MISSILE
+	PLAYER_DISTANCE = 200  # minimum distance from the player when shown
+	SPEED = 200  # speed of the missile
+	ENABLE_DELAY = 0.5  # duration of the fade in
+
+	def __init__(self):
+		super().__init__()
+		self.direction = 0  # angle (radians) the missile is pointing to
+
+	def update(self, dt, playerX, playerY):
+		"""
+		Points the missile to the player and moves it if it's enabled.
+
+		@param dt: seconds passed since the last update.
+		@param playerX: x position of the player.
+		@param playerY: y position of the player.
+		"""
+		# The direction is also needed when fading in (not enabled yet)
+		self.x, self.y, self.direction = homingStep(self.x, self.y, playerX, playerY,
+		                                            MissileBody.SPEED, dt, self.enabled)
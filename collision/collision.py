@@ -18,6 +18,7 @@ import gettext, os, pyglet
 from argparse import ArgumentParser
 from cocos.director import director
 
+from . import resources
 from .options import Options
 from .scenes.menu import MenuScene
 
@@ -51,5 +52,8 @@ def startGame():
 	director.window.set_icon(pyglet.resource.image("player.png"))
 	director.window.pop_handlers()  # remove default handler
 
+	# Decode the images of the balls (once for all games)
+	resources.load()
+
 	# Start game
 	director.run(MenuScene())
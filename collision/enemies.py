@@ -0,0 +1,694 @@
+# Collision - A ball dodging game
+# Copyright (C) 2016 Bruno Nova <brunomb.nova@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Stores of enemy balls used by the game engine.
+
+The "python" store keeps a list of EnemyBody objects. The "numpy" store keeps
+the state of all balls in NumPy arrays (one array per attribute) and moves them
+all at once, which is much faster with many balls. NumPy is optional: if it's
+not installed the "numpy" store isn't available. The "events" store moves the
+balls from collision to collision (an event-driven simulation).
+"""
+
+import heapq, math, random
+
+from . import kernels
+from .bodies import Arena, Body, Category, EnemyBody
+from .spatial import SpatialHash
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+_UNKNOWN_CELL = -2 ** 31  # cell of a ball not updated by updateIndex yet (fits in int32)
+
+__all__ = ["EnemyStore", "NumpyEnemyStore", "EnemyView", "EventEnemyStore",
+           "EventEnemyBody", "BACKENDS",
+           "createEnemyStore", "findOverlappingPairs", "moveBalls", "resolvePairs"]
+
+
+class EnemyStore:
+	"""Stores the enemy balls as a list of EnemyBody objects."""
+	NAME = "python"
+	KERNELS = "python"  # "numba" if the store uses the compiled kernels
+
+	def __init__(self):
+		self.balls = []
+		self._maxStep = 0  # longest distance moved by a ball in the last update
+
+	def __len__(self):
+		return len(self.balls)
+
+	def __iter__(self):
+		return iter(self.balls)
+
+	def __getitem__(self, index):
+		return self.balls[index]
+
+	def add(self, x, y, initialSpeed, rng=random):
+		"""
+		Adds an enemy ball, which is enabled after EnemyBody.ENABLE_DELAY.
+
+		@param x: initial x position of the ball.
+		@param y: initial y position of the ball.
+		@param initialSpeed: initial speed of the ball.
+		@param rng: random number generator used to pick the direction.
+		@return: the added ball.
+		"""
+		ball = EnemyBody(x, y, initialSpeed, rng)
+		ball.index = len(self.balls)
+		self.balls.append(ball)
+		return ball
+
+	def positions(self, alpha=1):
+		"""
+		Returns a list with the position (x, y) of each ball.
+
+		@param alpha: where the positions are between the previous (0) and the
+		              current (1) positions.
+		"""
+		if alpha == 1:
+			return [(ball.x, ball.y) for ball in self.balls]
+		return [ball.interpolate(alpha) for ball in self.balls]
+
+	def savePositions(self):
+		"""Saves the current positions as the previous ones (before an update)."""
+		for ball in self.balls:
+			ball.savePosition()
+
+	def maxStep(self):
+		"""
+		Returns the longest distance a ball may have moved in the last update().
+
+		It's recorded by update(), so it costs nothing. It's an upper bound: it
+		may be a bit longer than the real distance.
+		"""
+		return self._maxStep
+
+	def update(self, dt, factor, arena):
+		"""
+		Moves the balls and counts down the time until they are enabled.
+
+		@param dt: seconds passed since the last update.
+		@param factor: factor to multiply the speed by.
+		@param arena: the Arena.
+		"""
+		speed = 0  # largest |speedX| + |speedY| (never less than the speed)
+		for ball in self.balls:
+			ball.update(dt, factor, arena)
+			ball.updateEnableTime(dt)
+			ballSpeed = abs(ball.speedX) + abs(ball.speedY)
+			if ballSpeed > speed:
+				speed = ballSpeed
+		self._maxStep = speed * dt * factor
+
+	def updateIndex(self, index: SpatialHash):
+		"""
+		Updates the cells of the balls in a spatial index after they moved.
+
+		@param index: the index, which must contain all the balls.
+		"""
+		for ball in self.balls:
+			index.move(ball)
+
+	def bounceBalls(self, arena, broadphase=None):
+		"""
+		Bounces off one another all the enabled balls that overlap.
+
+		Without a broadphase every pair of balls is checked. With a broadphase
+		only the pairs that overlap at the start are resolved (in the same order),
+		so overlaps caused by pushing the balls apart are resolved in the next
+		update. Only this store uses the broadphase: the other stores ignore it.
+
+		@param arena: the Arena.
+		@param broadphase: optional SpatialHash or SweepAndPrune with all the balls.
+		"""
+		if broadphase is None:
+			balls = self.balls
+			for i, ball in enumerate(balls):
+				for other in balls[i + 1:]:
+					if ball.enabled and other.enabled and ball.collidesWith(other):
+						EnemyBody.bounceBalls(ball, other, arena)
+		else:
+			pairs = [(a, b) if a.index < b.index else (b, a)
+			         for a, b in broadphase.pairs(Category.ENEMY)]
+			pairs.sort(key=lambda pair: (pair[0].index, pair[1].index))
+			for ball, other in pairs:
+				if ball.collidesWith(other):  # may have been pushed apart already
+					EnemyBody.bounceBalls(ball, other, arena)
+
+
+def _column(name):
+	"""Creates a property that accesses the given array of the store of an EnemyView."""
+	def getter(self):
+		return getattr(self.store, name)[self.index].item()
+
+	def setter(self, value):
+		getattr(self.store, name)[self.index] = value
+
+	return property(getter, setter)
+
+
+class EnemyView(Body):
+	"""
+	An enemy ball kept in a NumpyEnemyStore.
+
+	It has the same attributes as an EnemyBody, but they are read from and
+	written to the arrays of the store.
+	"""
+	__slots__ = "store", "index"
+	CATEGORY = EnemyBody.CATEGORY
+	PLAYER_DISTANCE = EnemyBody.PLAYER_DISTANCE
+	ENABLE_DELAY = EnemyBody.ENABLE_DELAY
+
+	x = _column("x")
+	y = _column("y")
+	prevX = _column("prevX")
+	prevY = _column("prevY")
+	speedX = _column("speedX")
+	speedY = _column("speedY")
+	radius = _column("radius")
+	mass = _column("mass")
+	enabled = _column("enabled")
+	enableTime = _column("enableTime")
+
+	def __init__(self, store, index):
+		# Body.__init__ isn't called: the state is already in the store
+		self.store = store
+		self.index = index
+
+
+class NumpyEnemyStore(EnemyStore):
+	"""Stores the enemy balls in NumPy arrays, updating all of them at once."""
+	NAME = "numpy"
+	KERNELS = kernels.BACKEND
+	INITIAL_CAPACITY = 64
+
+	# Arrays kept by the store (names and types)
+	COLUMNS = (("x", float), ("y", float), ("prevX", float), ("prevY", float),
+	           ("speedX", float), ("speedY", float), ("radius", float),
+	           ("mass", float), ("enabled", bool), ("enableTime", float),
+	           ("initialSpeed", float), ("cellX", int), ("cellY", int))
+
+	def __init__(self):
+		if numpy is None:
+			raise RuntimeError("NumPy is not installed")
+		super().__init__()
+		self._rng = random
+		self._size = 0
+		self._indexCellSize = None  # size of the cells in the last updateIndex
+		self._allocate(NumpyEnemyStore.INITIAL_CAPACITY)
+
+	def __len__(self):
+		return self._size
+
+	def add(self, x, y, initialSpeed, rng=random):
+		if self._size == len(self._x):
+			self._allocate(2 * len(self._x))
+
+		i = self._size
+		self._size += 1
+		self._x[i], self._y[i] = x, y
+		self._prevX[i], self._prevY[i] = x, y
+		self._speedX[i], self._speedY[i] = 0, 0
+		self._radius[i] = Body.RADIUS
+		self._mass[i] = EnemyBody.MASS
+		self._enabled[i] = False
+		self._enableTime[i] = EnemyBody.ENABLE_DELAY
+		self._initialSpeed[i] = initialSpeed
+		self._cellX[i] = self._cellY[i] = _UNKNOWN_CELL  # moved by updateIndex
+		self._rng = rng
+
+		ball = EnemyView(self, i)
+		self.balls.append(ball)
+		return ball
+
+	# Views of the used part of the arrays
+	x = property(lambda self: self._x[:self._size])
+	y = property(lambda self: self._y[:self._size])
+	prevX = property(lambda self: self._prevX[:self._size])
+	prevY = property(lambda self: self._prevY[:self._size])
+	speedX = property(lambda self: self._speedX[:self._size])
+	speedY = property(lambda self: self._speedY[:self._size])
+	radius = property(lambda self: self._radius[:self._size])
+	mass = property(lambda self: self._mass[:self._size])
+	enabled = property(lambda self: self._enabled[:self._size])
+	enableTime = property(lambda self: self._enableTime[:self._size])
+	cellX = property(lambda self: self._cellX[:self._size])
+	cellY = property(lambda self: self._cellY[:self._size])
+
+	def positions(self, alpha=1):
+		if alpha == 1:
+			return list(zip(self.x.tolist(), self.y.tolist()))
+		x = self.prevX + (self.x - self.prevX) * alpha
+		y = self.prevY + (self.y - self.prevY) * alpha
+		return list(zip(x.tolist(), y.tolist()))
+
+	def savePositions(self):
+		self.prevX[:] = self.x
+		self.prevY[:] = self.y
+
+	def update(self, dt, factor, arena):
+		self._maxStep = moveBalls(self, numpy.flatnonzero(self.enabled), dt, factor,
+		                          arena.width, arena.height)
+		self._updateEnableTimes(dt)
+
+	def _updateEnableTimes(self, dt):
+		"""Counts down the time until the balls are enabled."""
+		enableTime = self.enableTime
+		waiting = enableTime > 0
+		if waiting.any():
+			enableTime[waiting] -= dt
+			for i in numpy.flatnonzero(waiting & (enableTime <= 0)).tolist():
+				enableTime[i] = 0
+				self._enable(i)
+
+	def updateIndex(self, index: SpatialHash):
+		# Find the balls whose cell changed, and only move those
+		cellX = numpy.floor(self.x / index.cellSize).astype(int)
+		cellY = numpy.floor(self.y / index.cellSize).astype(int)
+		if index.cellSize != self._indexCellSize:
+			changed = range(len(self))  # cells resized: the index was rebuilt
+			self._indexCellSize = index.cellSize
+		else:
+			changed = numpy.flatnonzero((cellX != self.cellX) | (cellY != self.cellY)).tolist()
+		for i in changed:
+			index.move(self.balls[i])
+		self.cellX[:] = cellX
+		self.cellY[:] = cellY
+
+	def bounceBalls(self, arena, broadphase=None):
+		"""
+		Bounces off one another all the enabled balls that overlap, in bulk.
+
+		The balls are always found with findOverlappingPairs, so the broadphase
+		is ignored.
+
+		The overlapping pairs are found at once and resolved in rounds of pairs
+		that don't share a ball, in the same order as EnemyStore.bounceBalls.
+		The result is the same, except that overlaps caused by pushing the balls
+		apart are only resolved in the next update.
+		"""
+		first, second = findOverlappingPairs(self.x, self.y, self.radius, self.enabled)
+		resolvePairs(self, first, second, arena.width, arena.height)
+
+	def _allocate(self, capacity):
+		"""Grows the arrays to the given capacity, keeping the stored balls."""
+		for name, dtype in self.COLUMNS:
+			old = getattr(self, "_" + name, None)
+			new = self._newArray(name, capacity, dtype)
+			if old is not None:
+				new[:self._size] = old[:self._size]
+			setattr(self, "_" + name, new)
+
+	def _newArray(self, name, capacity, dtype):
+		"""Creates an empty array for a column of the store."""
+		return numpy.zeros(capacity, dtype=dtype)
+
+	def _enable(self, i):
+		angle = self._rng.random() * math.pi * 2
+		self._speedX[i] = math.cos(angle) * self._initialSpeed[i]
+		self._speedY[i] = math.sin(angle) * self._initialSpeed[i]
+		self._enabled[i] = True
+
+
+class EventEnemyBody(EnemyBody):
+	"""An enemy ball of an EventEnemyStore."""
+	__slots__ = "time", "collisions"
+
+	def __init__(self, x, y, initialSpeed, rng=random):
+		super().__init__(x, y, initialSpeed, rng)
+		self.time = 0  # time of the store at which the position is x and y
+		self.collisions = 0  # number of collisions (to invalidate old events)
+
+	def advance(self, time):
+		"""Moves the ball in a straight line to its position at the given time."""
+		if time != self.time:
+			self.x += self.speedX * (time - self.time)
+			self.y += self.speedY * (time - self.time)
+			self.time = time
+
+
+class EventEnemyStore(EnemyStore):
+	"""
+	Stores the enemy balls and moves them with an event-driven simulation.
+
+	The balls move in straight lines at constant speed, so the times at which
+	they will hit a wall or another ball can be computed exactly. These events
+	are kept in a priority queue, and the store only does work when an event
+	happens: the positions between events are interpolated. The cost depends on
+	the number of collisions instead of the number of balls times the number of
+	frames, and fast balls never tunnel through or overlap each other.
+
+	The store has its own clock, which advances dt * factor in each update, so
+	the speed factor (speed down, speed up or freeze) scales the time.
+	"""
+	NAME = "events"
+	WALL_X, WALL_Y, BALL = 0, 1, 2  # kinds of events
+
+	def __init__(self):
+		super().__init__()
+		self.time = 0  # clock of the store
+		self.arena = Arena(0, 0)  # arena of the last update
+		self._events = []  # heap of (time, id, kind, ball, other, collisions)
+		self._eventId = 0  # increasing id of the events (to break ties)
+		self._waiting = []  # balls not enabled yet
+		self._maxSpeed = 0  # largest |speedX| + |speedY| a ball ever had
+
+	def add(self, x, y, initialSpeed, rng=random):
+		ball = EventEnemyBody(x, y, initialSpeed, rng)
+		ball.index = len(self.balls)
+		ball.time = self.time
+		self.balls.append(ball)
+		self._waiting.append(ball)
+		return ball
+
+	def update(self, dt, factor, arena):
+		self.arena = arena
+		end = self.time + dt * factor
+
+		# Process the events until the end of this update
+		events = self._events
+		while events and events[0][0] <= end:
+			time, _, kind, ball, other, collisions = heapq.heappop(events)
+			if collisions != self._collisionsOf(ball, other):
+				continue  # a ball collided since the event was predicted
+			self.time = time
+			self._resolve(kind, ball, other)
+
+		# Move all the balls to the end of the update
+		self.time = end
+		for ball in self.balls:
+			ball.advance(end)
+		self._maxStep = self._maxSpeed * dt * factor
+
+		# Count down the time until the balls are enabled
+		if self._waiting:
+			for ball in self._waiting:
+				if ball.updateEnableTime(dt):
+					self._predict(ball)
+			self._waiting = [ball for ball in self._waiting if not ball.enabled]
+
+	def bounceBalls(self, arena, broadphase=None):
+		"""Does nothing: the balls bounce in update(), at the exact time they collide."""
+
+	def _collisionsOf(self, ball, other):
+		if other is None:
+			return ball.collisions
+		return ball.collisions, other.collisions
+
+	def _push(self, time, kind, ball, other=None):
+		self._eventId += 1
+		heapq.heappush(self._events, (time, self._eventId, kind, ball, other,
+		                              self._collisionsOf(ball, other)))
+
+	def _predict(self, ball):
+		"""Predicts the next collisions of a ball with the walls and the other balls."""
+		now = self.time
+		radius = ball.radius
+		minX, maxX, minY, maxY = self.arena.limits(radius)
+		self._maxSpeed = max(self._maxSpeed, abs(ball.speedX) + abs(ball.speedY))
+
+		# Walls
+		if ball.speedX > 0:
+			self._push(now + max(maxX - ball.x, 0) / ball.speedX, self.WALL_X, ball)
+		elif ball.speedX < 0:
+			self._push(now + min(minX - ball.x, 0) / ball.speedX, self.WALL_X, ball)
+		if ball.speedY > 0:
+			self._push(now + max(maxY - ball.y, 0) / ball.speedY, self.WALL_Y, ball)
+		elif ball.speedY < 0:
+			self._push(now + min(minY - ball.y, 0) / ball.speedY, self.WALL_Y, ball)
+
+		# Other balls
+		for other in self.balls:
+			if other is ball or not other.enabled:
+				continue
+			other.advance(now)
+			dx, dy = other.x - ball.x, other.y - ball.y
+			dvx, dvy = other.speedX - ball.speedX, other.speedY - ball.speedY
+			dvdr = dx * dvx + dy * dvy
+			if dvdr >= 0:
+				continue  # moving away from each other
+			dvdv = dvx * dvx + dvy * dvy
+			drdr = dx * dx + dy * dy
+			radii = radius + other.radius
+			if drdr < radii * radii:
+				self._push(now, self.BALL, ball, other)  # overlapping: bounce now
+				continue
+			disc = dvdr * dvdr - dvdv * (drdr - radii * radii)
+			if disc >= 0:
+				self._push(now - (dvdr + math.sqrt(disc)) / dvdv, self.BALL, ball, other)
+
+	def _resolve(self, kind, ball, other):
+		"""Resolves an event that happens now, and predicts the next ones."""
+		now = self.time
+		ball.advance(now)
+		if kind == self.WALL_X:
+			ball.speedX = -ball.speedX
+			ball.ensureWithinBorders(self.arena)
+		elif kind == self.WALL_Y:
+			ball.speedY = -ball.speedY
+			ball.ensureWithinBorders(self.arena)
+		else:
+			other.advance(now)
+			EventEnemyStore._bounce(ball, other)
+			other.collisions += 1
+		ball.collisions += 1
+
+		self._predict(ball)
+		if other is not None:
+			self._predict(other)
+
+	@staticmethod
+	def _bounce(b1, b2):
+		"""Changes the speeds of two touching balls (like EnemyBody.bounceBalls)."""
+		deltaX = b1.x - b2.x
+		deltaY = b1.y - b2.y
+		dist = math.sqrt(deltaX * deltaX + deltaY * deltaY)
+		if dist == 0:
+			return
+		normalX, normalY = deltaX / dist, deltaY / dist
+		vn = (b1.speedX - b2.speedX) * normalX + (b1.speedY - b2.speedY) * normalY
+		if vn > 0:
+			return  # moving away from each other already
+
+		im1, im2 = 1 / b1.mass, 1 / b2.mass
+		restitution = 1
+		i = (-(1 + restitution) * vn) / (im1 + im2)
+		b1.speedX += normalX * i * im1
+		b1.speedY += normalY * i * im1
+		b2.speedX -= normalX * i * im2
+		b2.speedY -= normalY * i * im2
+
+
+def moveBalls(balls, indices, dt, factor, width, height):
+	"""
+	Moves some balls kept in arrays, bouncing them off the borders of the arena.
+
+	Only the elements of the given balls are written. If the kernels are
+	compiled, the balls are moved one at a time by a compiled loop instead.
+
+	@param balls: object with the arrays x, y, speedX, speedY and radius (like
+	              a NumpyEnemyStore).
+	@param indices: array with the indices of the balls to move.
+	@param dt: seconds passed since the last update.
+	@param factor: factor to multiply the speed by.
+	@param width: width of the arena.
+	@param height: height of the arena.
+	@return: the longest distance moved by a ball.
+	"""
+	if len(indices) == 0:
+		return 0
+	if kernels.BACKEND == "numba":
+		return kernels.moveBalls(balls.x, balls.y, balls.speedX, balls.speedY, balls.radius,
+		                         indices, dt, factor, width, height)
+
+	radius = balls.radius[indices]
+	speedX, speedY = balls.speedX[indices], balls.speedY[indices]
+
+	# Move balls
+	x = balls.x[indices] + speedX * dt * factor
+	y = balls.y[indices] + speedY * dt * factor
+
+	# Check borders
+	outX = (x < radius) | (x > width - radius)
+	outY = (y < radius) | (y > height - radius)
+	balls.speedX[indices] = numpy.where(outX, -speedX, speedX)
+	balls.speedY[indices] = numpy.where(outY, -speedY, speedY)
+	balls.x[indices] = numpy.clip(x, radius, width - radius)
+	balls.y[indices] = numpy.clip(y, radius, height - radius)
+	return math.sqrt((speedX * speedX + speedY * speedY).max()) * dt * factor
+
+def resolvePairs(balls, first, second, width, height):
+	"""
+	Bounces off one another pairs of overlapping balls kept in arrays.
+
+	The pairs are resolved in rounds of pairs that don't share a ball, in the
+	given order, like EnemyStore.bounceBalls. If the kernels are compiled, the
+	pairs are resolved one at a time instead, which gives the same result as
+	EnemyStore.bounceBalls.
+
+	@param balls: object with the arrays x, y, speedX, speedY, radius and mass
+	              (like a NumpyEnemyStore).
+	@param first: array with the index of the 1st ball of each pair.
+	@param second: array with the index of the 2nd ball of each pair.
+	@param width: width of the arena.
+	@param height: height of the arena.
+	"""
+	if len(first) == 0:
+		return
+	if kernels.BACKEND == "numba":
+		kernels.bouncePairs(balls.x, balls.y, balls.speedX, balls.speedY, balls.radius,
+		                    balls.mass, first, second, width, height)
+		return
+
+	# Round of each pair: 1 + the last round of a previous pair with its balls
+	rounds = []
+	lastRound = {}
+	for i, j in zip(first.tolist(), second.tolist()):
+		r = max(lastRound.get(i, -1), lastRound.get(j, -1)) + 1
+		lastRound[i] = lastRound[j] = r
+		rounds.append(r)
+	rounds = numpy.array(rounds)
+
+	for r in range(rounds.max() + 1):
+		inRound = rounds == r
+		_bouncePairs(balls, first[inRound], second[inRound], width, height)
+
+def _bouncePairs(balls, i, j, width, height):
+	"""Bounces pairs of balls (like EnemyBody.bounceBalls); no ball is in 2 pairs."""
+	x, y, speedX, speedY = balls.x, balls.y, balls.speedX, balls.speedY
+	radius = balls.radius
+
+	# Previous rounds may have pushed apart some pairs
+	deltaX = x[i] - x[j]
+	deltaY = y[i] - y[j]
+	radii = radius[i] + radius[j]
+	collide = deltaX * deltaX + deltaY * deltaY < radii * radii
+	i, j = i[collide], j[collide]
+	deltaX, deltaY, radii = deltaX[collide], deltaY[collide], radii[collide]
+	dist = numpy.sqrt(deltaX * deltaX + deltaY * deltaY)
+
+	# Prevent a possible division by zero
+	zero = dist == 0
+	dist[zero] = radii[zero] - 1
+	deltaX[zero] = radii[zero]
+	deltaY[zero] = 0
+
+	# Minimum Translation Distance to push balls apart after the collision
+	scale = (radii - dist) / dist
+	mtdX, mtdY = deltaX * scale, deltaY * scale
+
+	# Inverse mass quantities
+	im1, im2 = 1 / balls.mass[i], 1 / balls.mass[j]
+
+	# Push-pull them apart, ensuring the balls are still inside the arena
+	x[i] = numpy.clip(x[i] + mtdX * (im1 / (im1 + im2)), radius[i], width - radius[i])
+	y[i] = numpy.clip(y[i] + mtdY * (im1 / (im1 + im2)), radius[i], height - radius[i])
+	x[j] = numpy.clip(x[j] - mtdX * (im2 / (im1 + im2)), radius[j], width - radius[j])
+	y[j] = numpy.clip(y[j] - mtdY * (im2 / (im1 + im2)), radius[j], height - radius[j])
+
+	# Impact speed (along the collision normal)
+	mtdLength = numpy.sqrt(mtdX * mtdX + mtdY * mtdY)
+	with numpy.errstate(invalid="ignore", divide="ignore"):
+		normalX, normalY = mtdX / mtdLength, mtdY / mtdLength
+	vn = (speedX[i] - speedX[j]) * normalX + (speedY[i] - speedY[j]) * normalY
+
+	# Skip balls moving away from each other already (or just touching)
+	approaching = (mtdLength != 0) & (vn <= 0)
+	i, j = i[approaching], j[approaching]
+	im1, im2 = im1[approaching], im2[approaching]
+	normalX, normalY = normalX[approaching], normalY[approaching]
+
+	# Collision impulse
+	restitution = 1
+	impulse = (-(1 + restitution) * vn[approaching]) / (im1 + im2)
+	impulseX, impulseY = normalX * impulse, normalY * impulse
+
+	# Change in momentum
+	speedX[i] += impulseX * im1
+	speedY[i] += impulseY * im1
+	speedX[j] -= impulseX * im2
+	speedY[j] -= impulseY * im2
+
+def findOverlappingPairs(x, y, radius, enabled):
+	"""
+	Finds all pairs of enabled balls that overlap, using NumPy.
+
+	The balls are sorted by x, and each ball is compared with the next ones in
+	that order (all balls at once) while their distance in x can still be less
+	than the sum of the radii (sweep and prune).
+
+	@param x: array with the x positions of the balls.
+	@param y: array with the y positions of the balls.
+	@param radius: array with the radii of the balls.
+	@param enabled: array with whether each ball is enabled.
+	@return: tuple (first, second) of arrays with the indices of the balls of
+	         each pair, with first < second, sorted by (first, second).
+	"""
+	indices = numpy.flatnonzero(enabled)
+	order = indices[numpy.argsort(x[indices], kind="stable")]
+	sortedX, sortedY, sortedR = x[order], y[order], radius[order]
+	reach = 2 * sortedR.max() if len(order) > 0 else 0
+
+	firsts, seconds = [], []
+	for offset in range(1, len(order)):
+		deltaX = sortedX[offset:] - sortedX[:-offset]
+		near = deltaX < reach
+		if not near.any():
+			break  # further balls in x order are even farther
+		deltaY = sortedY[offset:] - sortedY[:-offset]
+		radii = sortedR[offset:] + sortedR[:-offset]
+		collide = near & (deltaX * deltaX + deltaY * deltaY < radii * radii)
+		a = order[:-offset][collide]
+		b = order[offset:][collide]
+		firsts.append(numpy.minimum(a, b))
+		seconds.append(numpy.maximum(a, b))
+
+	if not firsts:
+		empty = numpy.zeros(0, dtype=int)
+		return empty, empty
+
+	first, second = numpy.concatenate(firsts), numpy.concatenate(seconds)
+	pairOrder = numpy.lexsort((second, first))
+	return first[pairOrder], second[pairOrder]
+
+
+BACKENDS = {EnemyStore.NAME: EnemyStore, EventEnemyStore.NAME: EventEnemyStore}
+if numpy is not None:
+	BACKENDS[NumpyEnemyStore.NAME] = NumpyEnemyStore
+
+
+def createEnemyStore(backend=None):
+	"""
+	Creates a store of enemy balls.
+
+	@param backend: name of the store ("python", "numpy", "events" or
+	                "parallel"). By default the "python" store is used: a game
+	                starts with a few balls, and the "numpy" store is only
+	                faster with a few dozen balls or more.
+	@return: the created store.
+	"""
+	if backend == "parallel" and numpy is not None:
+		from .parallel import ParallelEnemyStore  # only loaded when used
+		return ParallelEnemyStore()
+	if backend is None:
+		backend = EnemyStore.NAME
+	if backend not in BACKENDS:
+		raise ValueError("Unknown or unavailable enemy backend: {}".format(backend))
+	return BACKENDS[backend]()
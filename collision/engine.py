@@ -0,0 +1,492 @@
+# Collision - A ball dodging game
+# Copyright (C) 2016 Bruno Nova <brunomb.nova@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+The game engine: the state of a game and its step logic.
+
+This module doesn't depend on Cocos or pyglet, so a game can be simulated
+without a window (and much faster than real time). The GameLayer is only a
+renderer of the state kept here.
+"""
+
+import math, random
+
+from .bodies import *
+from .enemies import EnemyStore, createEnemyStore
+from .options import Options
+from .spatial import SpatialHash, SweepAndPrune
+from .timer import Scheduler, Timer
+
+__all__ = ["GameListener", "GameEngine"]
+
+
+class GameListener:
+	"""
+	Receives the events of a GameEngine (used to draw the game).
+
+	All methods do nothing by default.
+	"""
+	def onEnemyAdded(self, enemy: EnemyBody): pass
+	def onBonusShown(self, bonus: BonusBody): pass
+	def onBonusHidden(self, bonus: BonusBody): pass
+	def onMissileShown(self, missile: MissileBody): pass
+	def onMissileHidden(self, missile: MissileBody): pass
+	def onPlayerFrozen(self, player: PlayerBody): pass
+	def onPlayerUnfrozen(self, player: PlayerBody): pass
+	def onPlayerInvulnerable(self, player: PlayerBody): pass
+	def onPlayerVulnerable(self, player: PlayerBody): pass
+	def onGameOver(self): pass
+
+
+class GameEngine:
+	"""Holds the state of a game and updates it."""
+	# Categories of the balls that the player can collide with
+	PLAYER_COLLISIONS = Category.ENEMY | Category.COIN | Category.BONUS | Category.MISSILE
+	SPAWN_ATTEMPTS = 10  # random positions tried before looking for a free cell
+
+	def __init__(self, options: Options, width, height, listener=None, rng=None,
+	             backend=None, broadphase="grid", tickRate=60, maxSubsteps=5,
+	             sweptCollisions=True):
+		"""
+		Creates the engine and starts a new game.
+
+		@param options: game options.
+		@param width: width of the arena.
+		@param height: height of the arena.
+		@param listener: optional GameListener that receives the game events.
+		@param rng: optional random number generator (like random.Random(seed)),
+		            to make the game reproducible.
+		@param backend: optional name of the store of enemy balls (see
+		                enemies.createEnemyStore).
+		@param broadphase: how the "python" enemy store finds the enemies that
+		                   collide: "grid" (the SpatialHash of all balls) or
+		                   "sap" (a SweepAndPrune of the enemies). The other
+		                   stores find them their own way, so they only accept
+		                   "grid".
+		@param tickRate: updates per second done by advance().
+		@param maxSubsteps: maximum number of updates done by each call to
+		                    advance() (the rest of the time is dropped).
+		@param sweptCollisions: whether to check the whole path of the player in
+		                        each update against the paths of the enemies and
+		                        the missile, so a fast mouse can't jump over them.
+		"""
+		self.options = options
+		self.arena = Arena(width, height)  # size and limits of the arena
+		self.listener = listener if listener is not None else GameListener()
+		self.random = rng if rng is not None else random
+
+		self.enemies = createEnemyStore(backend)
+		self.backend = self.enemies.NAME  # name of the enemy store in use
+		self.kernels = self.enemies.KERNELS  # "numba" if the store uses compiled kernels
+		self.isGameOver = False
+		self.time = 0
+		self.coins = 0
+		self.mouseX, self.mouseY = 0, 0  # mouse movement since the last update
+		self.keyX, self.keyY = 0, 0  # direction of the arrow keys
+		self.tickTime = 1 / tickRate  # duration of each update done by advance()
+		self.maxSubsteps = maxSubsteps
+		self._accumulator = 0  # time not simulated yet by advance()
+		self.sweptCollisions = sweptCollisions
+
+		# Set timers (all timers count down, with the clock of the scheduler)
+		self.scheduler = Scheduler()
+		self.timers = dict()
+		if self.options.isTime():
+			# Timer to add new enemy
+			self.timers["addEnemy"] = Timer(self.scheduler, options.getIntervalAddEnemy(),
+			                                callback=self.onAddEnemyTimer)
+		if self.options.bonuses:
+			# Timers related to bonuses (showBonus is paused while the bonus is shown)
+			self.timers["showBonus"] = Timer(self.scheduler, self.random.randint(3, 10),
+			                                 callback=self.onShowBonusTimer,
+			                                 min_=3, max_=10)
+			self.timers["speedDown"] = Timer(self.scheduler)
+			self.timers["speedUp"] = Timer(self.scheduler)
+			self.timers["freeze"] = Timer(self.scheduler)
+			self.timers["freezePlayer"] = Timer(self.scheduler, callback=self.onFreezePlayerTimer)
+			self.timers["invulnerable"] = Timer(self.scheduler, callback=self.onInvulnerableTimer)
+			self.timers["missile"] = Timer(self.scheduler, callback=self.onMissileTimer)
+
+		# Create player ball
+		self.player = PlayerBody(width // 2, height // 2)
+
+		# Index of all the balls, kept between updates
+		self.index = SpatialHash(2 * Body.RADIUS)
+		self.index.add(self.player)
+
+		# Broadphase used to find the enemies that collide
+		if broadphase == "grid":
+			self.enemyBroadphase = self.index
+		elif broadphase == "sap":
+			if self.enemies.NAME != EnemyStore.NAME:
+				raise ValueError("The {} enemy store doesn't support the sap broadphase"
+				                 .format(self.enemies.NAME))
+			self.enemyBroadphase = SweepAndPrune()
+		else:
+			raise ValueError("Unknown broadphase: {}".format(broadphase))
+
+		if self.options.isCoins():
+			# Create coin
+			self.coin = CoinBody(0, 0)
+			self.setRandomPosition(self.coin, CoinBody.PLAYER_DISTANCE)
+			self.index.add(self.coin)
+
+		if self.options.bonuses:
+			# Create bonus and missile (both hidden)
+			self.bonus = BonusBody()
+			self.index.add(self.bonus)
+			self.missile = MissileBody()
+			self.index.add(self.missile)
+
+		# Create enemy balls
+		for x in range(3):
+			self.addEnemy()
+
+	def addEnemy(self):
+		"""
+		Adds a new enemy ball.
+
+		@return: the added ball.
+		"""
+		x, y = self.randomPosition(Body.RADIUS, EnemyBody.PLAYER_DISTANCE)
+		enemy = self.enemies.add(x, y, self.options.getEnemySpeed(), self.random)
+		self.index.add(enemy)
+		self.index.retune(self.arena.width, self.arena.height)
+		if self.enemyBroadphase is not self.index:
+			self.enemyBroadphase.add(enemy)
+		self.listener.onEnemyAdded(enemy)
+		return enemy
+
+	def getNumberOfEnemies(self):
+		"""Returns the number of enemy balls."""
+		return len(self.enemies)
+
+	def getScore(self):
+		"""Returns the score of the game (seconds or coins, depending on the type)."""
+		return int(self.time) if self.options.isTime() else self.coins
+
+	def randomPosition(self, radius, minPlayerDistance, ignore=None):
+		"""
+		Returns a random position for a ball, away from the player and the other balls.
+
+		A few random positions are tried first. If they all fail (the arena is
+		crowded), a random free cell of a grid over the arena is picked, so the
+		time is bounded. If no cell is free, the position is only away from the
+		player (or in the farthest corner from the player, if there's no room).
+
+		@param radius: radius of the ball.
+		@param minPlayerDistance: minimum distance from the player.
+		@param ignore: optional ball that the position may overlap (the ball
+		               being moved).
+		@return: tuple (x, y) with the position.
+		"""
+		minX, maxX, minY, maxY = self.arena.limits(radius)
+		for attempt in range(GameEngine.SPAWN_ATTEMPTS):
+			x = self.random.randint(minX, maxX)
+			y = self.random.randint(minY, maxY)
+			if math.hypot(x - self.player.x, y - self.player.y) >= minPlayerDistance \
+			   and self._isFree(x, y, radius, ignore):
+				return x, y
+		return self._freeCellPosition(radius, minPlayerDistance, ignore)
+
+	def setRandomPosition(self, body, minPlayerDistance):
+		"""
+		Moves a ball to a random position.
+
+		@param body: the ball to move.
+		@param minPlayerDistance: minimum distance from the player.
+		"""
+		body.x, body.y = self.randomPosition(body.radius, minPlayerDistance, body)
+		body.savePosition()  # don't interpolate the jump
+		if body in self.index:
+			self.index.move(body)
+
+	def moveMouse(self, dx, dy):
+		"""
+		Accumulates a mouse movement, applied to the player in the next update.
+
+		@param dx: movement in x.
+		@param dy: movement in y.
+		"""
+		self.mouseX += dx
+		self.mouseY += dy
+
+	def setKeyDirection(self, keyX, keyY):
+		"""
+		Sets the direction the arrow keys are pressed.
+
+		@param keyX: direction in x (-1, 0 or 1).
+		@param keyY: direction in y (-1, 0 or 1).
+		"""
+		self.keyX, self.keyY = keyX, keyY
+
+	def gameOver(self):
+		"""Ends the game."""
+		if not self.isGameOver:
+			self.isGameOver = True
+			self.listener.onGameOver()
+
+	def giveBonus(self):
+		"""Gives a random advantage or disadvantage to the player."""
+		self.hideBonus()
+
+		# Select the bonus
+		bonus = self.random.randint(0, 5)
+		if bonus == 0:  # speed down enemy balls
+			self.timers["speedUp"].time = 0
+			self.timers["speedDown"].time = 6
+			self.timers["freeze"].time = 0
+		elif bonus == 1:  # speed up enemy balls
+			self.timers["speedUp"].time = 3
+			self.timers["speedDown"].time = 0
+			self.timers["freeze"].time = 0
+		elif bonus == 2:  # freeze enemy balls
+			self.timers["speedUp"].time = 0
+			self.timers["speedDown"].time = 0
+			self.timers["freeze"].time = 5
+		elif bonus == 3:  # freeze player ball
+			self.timers["freezePlayer"].time = 0.6
+			self.player.frozen = True
+			self.listener.onPlayerFrozen(self.player)
+		elif bonus == 4:  # player invulnerability
+			self.timers["invulnerable"].time = 6
+			self.player.makeInvulnerable()
+			self.listener.onPlayerInvulnerable(self.player)
+		else:  # missile
+			self.timers["missile"].time = 5
+			self.showMissile()
+
+	def showBonus(self):
+		"""Shows the bonus in a random position, if it isn't shown yet."""
+		if not self.bonus.enabled:
+			self.setRandomPosition(self.bonus, BonusBody.PLAYER_DISTANCE)
+			self.bonus.enabled = True
+			self.timers["showBonus"].pause()  # only counts down while hidden
+			self.listener.onBonusShown(self.bonus)
+
+	def hideBonus(self):
+		"""Hides the bonus."""
+		self.bonus.enabled = False
+		self.timers["showBonus"].resume()
+		self.listener.onBonusHidden(self.bonus)
+
+	def showMissile(self):
+		"""Shows the missile in a random position, if it isn't enabled yet."""
+		if not self.missile.enabled:
+			self.setRandomPosition(self.missile, MissileBody.PLAYER_DISTANCE)
+			self.missile.enableLater(MissileBody.ENABLE_DELAY)
+			self.listener.onMissileShown(self.missile)
+
+	def hideMissile(self):
+		"""Hides the missile."""
+		self.missile.enableLater(0)  # disable it and cancel a pending enable
+		self.listener.onMissileHidden(self.missile)
+
+	def isSpeedDown(self):
+		return self.options.bonuses and self.timers["speedDown"].time > 0
+
+	def isSpeedUp(self):
+		return self.options.bonuses and self.timers["speedUp"].time > 0
+
+	def isFreeze(self):
+		return self.options.bonuses and self.timers["freeze"].time > 0
+
+	def onAddEnemyTimer(self, timer):
+		timer.time += self.options.getIntervalAddEnemy()
+		self.addEnemy()
+
+	def onShowBonusTimer(self, timer, min_, max_):
+		timer.time = self.random.randint(min_, max_)
+		self.showBonus()
+
+	def onFreezePlayerTimer(self, timer):
+		self.player.frozen = False
+		self.listener.onPlayerUnfrozen(self.player)
+
+	def onInvulnerableTimer(self, timer):
+		if self.player.invulnerable:
+			self.player.makeVulnerable()
+			self.listener.onPlayerVulnerable(self.player)
+
+	def onMissileTimer(self, timer):
+		self.hideMissile()
+
+	def advance(self, dt):
+		"""
+		Advances the game by dt seconds, with updates of fixed duration (tickTime).
+
+		The time left that doesn't complete an update is kept for the next call.
+		At most maxSubsteps updates are done, so after a long hitch the game
+		slows down instead of doing a big update.
+
+		@param dt: seconds passed since the last call.
+		@return: fraction of an update that is left (0 to 1), used to
+		         interpolate the positions of the balls when drawing them.
+		"""
+		self._accumulator += dt
+		steps = 0
+		while self._accumulator >= self.tickTime and not self.isGameOver:
+			if steps == self.maxSubsteps:
+				self._accumulator %= self.tickTime  # drop the time left behind
+				break
+			self.update(self.tickTime)
+			self._accumulator -= self.tickTime
+			steps += 1
+		return min(self._accumulator / self.tickTime, 1)
+
+	def simulate(self, duration, dt=1 / 60):
+		"""
+		Updates the game with a fixed time step, without a window.
+
+		@param duration: seconds of game time to simulate.
+		@param dt: seconds per update.
+		@return: the number of updates done (the game may end before duration).
+		"""
+		frames = 0
+		while frames * dt < duration and not self.isGameOver:
+			self.update(dt)
+			frames += 1
+		return frames
+
+	def _isFree(self, x, y, radius, ignore=None):
+		"""Returns whether a circle doesn't overlap any ball shown (enabled or fading in)."""
+		for ball in self.index.near(x, y, radius + self.index.maxRadius):
+			if ball is not ignore and (ball.enabled or ball.enableTime > 0):
+				dx = ball.x - x
+				dy = ball.y - y
+				radii = ball.radius + radius
+				if dx * dx + dy * dy < radii * radii:
+					return False
+		return True
+
+	def _freeCellPosition(self, radius, minPlayerDistance, ignore=None):
+		"""
+		Returns a random position in a random free cell of a grid over the arena.
+
+		The cells are as wide as the ball. A cell is free if all of its points
+		are away from the player and no ball overlaps a ball centred in any of
+		its points.
+		"""
+		minX, maxX, minY, maxY = self.arena.limits(radius)
+		playerX, playerY = self.player.x, self.player.y
+		size = 2 * radius
+		halfDiagonal = size / math.sqrt(2)
+
+		farCells, freeCells = [], []
+		for x0 in range(minX, maxX + 1, size):
+			x1 = min(x0 + size, maxX)
+			for y0 in range(minY, maxY + 1, size):
+				y1 = min(y0 + size, maxY)
+				# Point of the cell nearest to the player
+				nearX = min(max(playerX, x0), x1)
+				nearY = min(max(playerY, y0), y1)
+				if math.hypot(nearX - playerX, nearY - playerY) < minPlayerDistance:
+					continue
+				cell = x0, y0, x1, y1
+				farCells.append(cell)
+				if self._isFree((x0 + x1) / 2, (y0 + y1) / 2, radius + halfDiagonal, ignore):
+					freeCells.append(cell)
+
+		cells = freeCells or farCells
+		if cells:
+			x0, y0, x1, y1 = self.random.choice(cells)
+			return self.random.randint(x0, x1), self.random.randint(y0, y1)
+		corners = (minX, minY), (minX, maxY), (maxX, minY), (maxX, maxY)
+		return max(corners, key=lambda corner: math.hypot(corner[0] - playerX,
+		                                                  corner[1] - playerY))
+
+	def _sweepPlayer(self, dt):
+		"""Returns whether the player hit an enemy or the missile along its path."""
+		margin = max(self.enemies.maxStep(), MissileBody.SPEED * dt)
+		return bool(self.index.sweep(self.player, Category.ENEMY | Category.MISSILE, margin))
+
+	def update(self, dt):
+		"""
+		Updates the game.
+
+		@param dt: seconds passed since the last update.
+		"""
+		if self.isGameOver:
+			return
+
+		self.time += dt  # count total game time
+		arena = self.arena
+		player = self.player
+
+		# Save the positions before the update (to interpolate them)
+		player.savePosition()
+		self.enemies.savePositions()
+		if self.options.isCoins():
+			self.coin.savePosition()
+		if self.options.bonuses:
+			self.bonus.savePosition()
+			self.missile.savePosition()
+
+		# Update player ball
+		player.update(dt, self.mouseX, self.mouseY, self.keyX, self.keyY, arena)
+		self.mouseX, self.mouseY = 0, 0
+		self.index.move(player)
+
+		# Determine factor to multiply enemy balls speed by
+		if self.isSpeedDown():
+			factor = 0.5
+		elif self.isSpeedUp():
+			factor = 1.5
+		elif self.isFreeze():
+			factor = 0.0
+		else:
+			factor = 1.0
+
+		# Update enemy balls
+		self.enemies.update(dt, factor, arena)
+		self.enemies.updateIndex(self.index)
+
+		# Update coin, bonus and missile
+		if self.options.isCoins():
+			self.coin.updateEnableTime(dt)
+		if self.options.bonuses:
+			self.missile.update(dt, player.x, player.y)
+			self.index.move(self.missile)
+			self.missile.updateEnableTime(dt)
+
+		# Find everything the player is touching
+		touching = self.index.touching(player, self.PLAYER_COLLISIONS)
+
+		# Check collision between player and coin
+		if Category.COIN in touching:
+			self.coins += 1
+			# Move the coin to a random position
+			self.setRandomPosition(self.coin, CoinBody.PLAYER_DISTANCE)
+			if self.coins % self.options.getCoinsAddEnemy() == 0:
+				self.addEnemy()  # add an enemy every N coins
+
+		# Check collision between player and bonus
+		if Category.BONUS in touching:
+			self.giveBonus()
+
+		# Check collisions between player and missile or enemies
+		if not player.invulnerable:
+			if Category.MISSILE in touching or Category.ENEMY in touching:
+				self.gameOver()
+			elif self.sweptCollisions and self._sweepPlayer(dt):
+				self.gameOver()
+
+		# Check collisions between enemies
+		if self.options.ballsCollide:
+			self.enemies.bounceBalls(arena, self.enemyBroadphase)
+
+		# Update timers (only the ones that reach 0 are called)
+		self.scheduler.advance(dt)
@@ -0,0 +1,183 @@
+# Collision - A ball dodging game
+# Copyright (C) 2016 Bruno Nova <brunomb.nova@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Helpers to write the files of the user safely.
+"""
+
+import atexit, os, threading, traceback
+from contextlib import contextmanager
+
+try:
+	import fcntl
+except ImportError:  # Windows
+	fcntl = None
+	import msvcrt
+
+__all__ = ["writeAtomically", "lockFile", "BackgroundWriter"]
+
+
+def writeAtomically(filename, text):
+	"""
+	Writes a text file atomically.
+
+	The text is written to a temporary file in the same folder, flushed to the
+	disk, and then renamed over the file. So the file always has either the old
+	or the new contents, even if the game crashes while writing it.
+
+	@param filename: path of the file (its folder is created if needed).
+	@param text: the new contents of the file.
+	"""
+	os.makedirs(os.path.dirname(filename), exist_ok=True)
+	tempFilename = "{}.{}.tmp".format(filename, os.getpid())
+	try:
+		with open(tempFilename, "w") as file:
+			file.write(text)
+			file.flush()
+			os.fsync(file.fileno())
+		os.replace(tempFilename, filename)
+	except BaseException:
+		if os.path.exists(tempFilename):
+			os.remove(tempFilename)
+		raise
+
+@contextmanager
+def lockFile(filename):
+	"""
+	Locks a file while in the block, waiting until other processes unlock it.
+
+	The lock is taken on a "<filename>.lock" file (the file itself is replaced
+	when it's written atomically). Only the processes that use this function
+	wait for the lock: the file can still be read.
+
+	@param filename: path of the file (its folder is created if needed).
+	"""
+	os.makedirs(os.path.dirname(filename), exist_ok=True)
+	with open(filename + ".lock", "a") as file:
+		if fcntl is not None:
+			fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+		else:
+			file.seek(0)
+			msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+		try:
+			yield
+		finally:
+			if fcntl is not None:
+				fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+			else:
+				file.seek(0)
+				msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class BackgroundWriter:
+	"""
+	Writes files atomically in a background thread.
+
+	The writes wait in a queue that keeps only the latest text of each file,
+	so several writes of a file done before the thread gets to it are written
+	only once. The files are locked (with lockFile) while written, and the
+	pending writes are done when the program exits.
+
+	Other slow tasks (like the writes of a database) can also be queued with
+	run().
+	"""
+	def __init__(self):
+		self._pending = {}  # key (file name) -> task waiting to run
+		self._running = None  # key of the task running
+		self._condition = threading.Condition()  # protects the above
+		self._runLock = threading.Lock()  # only one task at a time
+		self._thread = None  # started by the first task
+		atexit.register(self.flush)
+
+	def write(self, filename, text, callback=None):
+		"""
+		Queues a write of a file (replacing a pending write of the same file).
+
+		@param filename: path of the file.
+		@param text: the new contents of the file, or a function that returns
+		             them (called while the file is locked, just before
+		             writing it; e.g. to merge them with the current contents).
+		@param callback: optional function called after writing the file (in
+		                 the writing thread) with the error (an OSError, or the
+		                 exception raised by text) as argument, or None if it
+		                 was written. If the file could be locked, it's still
+		                 locked during the call.
+		"""
+		self.run(filename, lambda: _writeLocked(filename, text, callback))
+
+	def run(self, key, task):
+		"""
+		Queues a task (replacing a pending task with the same key).
+
+		@param key: name of the task (the name of the file it writes).
+		@param task: function called without arguments in the background
+		             thread. It should handle its own errors: the exceptions
+		             it raises are only printed.
+		"""
+		with self._condition:
+			self._pending[key] = task
+			if self._thread is None:
+				self._thread = threading.Thread(target=self._run, name="BackgroundWriter",
+				                                daemon=True)  # flush() is called on exit
+				self._thread.start()
+			self._condition.notify()
+
+	def isPending(self, key):
+		"""Returns whether a task (or file) is waiting to run, or running."""
+		with self._condition:
+			return key in self._pending or key == self._running
+
+	def flush(self):
+		"""Runs the pending tasks now, and waits until they're done."""
+		with self._runLock:
+			while True:
+				with self._condition:
+					if not self._pending:
+						return
+					key = next(iter(self._pending))
+					task = self._pending.pop(key)
+					self._running = key
+				try:
+					task()
+				except Exception:
+					traceback.print_exc()  # keep running the other tasks
+				finally:
+					with self._condition:
+						self._running = None
+
+	def _run(self):
+		while True:
+			with self._condition:
+				while not self._pending:
+					self._condition.wait()
+			self.flush()
+
+
+def _writeLocked(filename, text, callback):
+	"""Writes a file while locked (see BackgroundWriter.write)."""
+	try:
+		with lockFile(filename):
+			try:
+				writeAtomically(filename, text() if callable(text) else text)
+			except Exception as e:
+				error = e  # e.g. text failed (reported while still locked)
+			else:
+				error = None
+			if callback is not None:
+				callback(error)
+	except OSError as e:  # the file couldn't be locked
+		if callback is not None:
+			callback(e)
@@ -0,0 +1,183 @@
+# Collision - A ball dodging game
+# Copyright (C) 2016 Bruno Nova <brunomb.nova@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Numeric kernels of the physics of the balls.
+
+The kernels that work on one or two balls (reflect, bounce and homingStep) are
+plain Python functions: they're called once per ball from Python, where the
+overhead of calling compiled code would be larger than what it saves.
+
+The kernels that loop over whole arrays (moveBalls and bouncePairs), used by
+the stores that keep the balls in arrays, are compiled to machine code by
+Numba, if it's installed, the first time they're called, and the compiled code
+is cached on disk for the next launches. Otherwise (or if the COLLISION_NO_JIT
+environment variable is set) they're plain Python functions. BACKEND tells
+which is in use.
+"""
+
+import math, os
+
+try:
+	import numba
+except ImportError:
+	numba = None
+
+__all__ = ["BACKEND", "reflect", "bounce", "homingStep", "moveBalls", "bouncePairs"]
+
+if numba is not None and not os.environ.get("COLLISION_NO_JIT"):
+	BACKEND = "numba"
+	_jit = numba.njit(cache=True)
+else:
+	BACKEND = "python"
+	_jit = lambda function: function
+
+
+def reflect(position, speed, low, high):
+	"""
+	Bounces a ball off the borders of the arena, in one axis.
+
+	@param position: position of the ball.
+	@param speed: speed of the ball.
+	@param low: minimum position of the ball (its radius).
+	@param high: maximum position of the ball (the size of the arena minus
+	             its radius).
+	@return: tuple (position, speed) with the position inside the arena and
+	         the speed (reversed if the ball was outside).
+	"""
+	if position < low or position > high:
+		speed = -speed
+	return min(max(position, low), high), speed
+
+def bounce(x1, y1, speedX1, speedY1, radius1, mass1,
+           x2, y2, speedX2, speedY2, radius2, mass2, width, height):
+	"""
+	Bounces two balls off one another after a collision.
+
+	The balls are pushed apart (but kept inside the arena), and if they were
+	approaching, their speeds change with an elastic impulse.
+
+	@return: tuple (x1, y1, speedX1, speedY1, x2, y2, speedX2, speedY2) with the
+	         new positions and speeds of the balls.
+	"""
+	deltaX = x1 - x2
+	deltaY = y1 - y2
+	dist = math.sqrt(deltaX * deltaX + deltaY * deltaY)
+
+	if dist == 0:  # prevent a possible division by zero
+		dist = radius1 + radius2 - 1
+		deltaX, deltaY = radius1 + radius2, 0.0
+
+	# Minimum Translation Distance to push balls apart after the collision
+	scale = (radius1 + radius2 - dist) / dist
+	mtdX, mtdY = deltaX * scale, deltaY * scale
+
+	# Inverse mass quantities
+	im1, im2 = 1 / mass1, 1 / mass2
+
+	# Push-pull them apart, ensuring the balls are still inside the arena
+	x1 = min(max(x1 + mtdX * (im1 / (im1 + im2)), radius1), width - radius1)
+	y1 = min(max(y1 + mtdY * (im1 / (im1 + im2)), radius1), height - radius1)
+	x2 = min(max(x2 - mtdX * (im2 / (im1 + im2)), radius2), width - radius2)
+	y2 = min(max(y2 - mtdY * (im2 / (im1 + im2)), radius2), height - radius2)
+
+	# Impact speed (along the collision normal)
+	mtdLength = math.sqrt(mtdX * mtdX + mtdY * mtdY)
+	if mtdLength == 0:  # touching, but not overlapping
+		return x1, y1, speedX1, speedY1, x2, y2, speedX2, speedY2
+	normalX, normalY = mtdX / mtdLength, mtdY / mtdLength
+	vn = (speedX1 - speedX2) * normalX + (speedY1 - speedY2) * normalY
+
+	# Sphere intersecting but moving away from each other already
+	if vn > 0:
+		return x1, y1, speedX1, speedY1, x2, y2, speedX2, speedY2
+
+	# Collision impulse
+	restitution = 1
+	i = (-(1 + restitution) * vn) / (im1 + im2)
+	impulseX, impulseY = normalX * i, normalY * i
+
+	# Change in momentum
+	return x1, y1, speedX1 + impulseX * im1, speedY1 + impulseY * im1, \
+	       x2, y2, speedX2 - impulseX * im2, speedY2 - impulseY * im2
+
+def homingStep(x, y, targetX, targetY, speed, dt, moving):
+	"""
+	Points a homing ball to a target and moves it in that direction.
+
+	@param x: x position of the ball.
+	@param y: y position of the ball.
+	@param targetX: x position of the target.
+	@param targetY: y position of the target.
+	@param speed: speed of the ball.
+	@param dt: seconds passed since the last update.
+	@param moving: whether the ball moves (it's only pointed if not).
+	@return: tuple (x, y, direction) with the new position of the ball and the
+	         angle (radians) it's pointing to.
+	"""
+	direction = math.atan2(targetY - y, targetX - x)
+	if moving:
+		x += math.cos(direction) * speed * dt
+		y += math.sin(direction) * speed * dt
+	return x, y, direction
+
+# Compiled copies of reflect and bounce, called by the compiled loops
+_reflect = _jit(reflect)
+_bounce = _jit(bounce)
+
+@_jit
+def moveBalls(x, y, speedX, speedY, radius, indices, dt, factor, width, height):
+	"""
+	Moves some balls kept in arrays, bouncing them off the borders of the arena.
+
+	This loop is only fast when compiled.
+
+	@param indices: array with the indices of the balls to move.
+	@param dt: seconds passed since the last update.
+	@param factor: factor to multiply the speed by.
+	@return: the longest distance moved by a ball.
+	"""
+	speed = 0.0  # largest squared speed
+	for k in range(len(indices)):
+		i = indices[k]
+		x[i], speedX[i] = _reflect(x[i] + speedX[i] * dt * factor, speedX[i],
+		                           radius[i], width - radius[i])
+		y[i], speedY[i] = _reflect(y[i] + speedY[i] * dt * factor, speedY[i],
+		                           radius[i], height - radius[i])
+		speed = max(speed, speedX[i] * speedX[i] + speedY[i] * speedY[i])
+	return math.sqrt(speed) * dt * factor
+
+@_jit
+def bouncePairs(x, y, speedX, speedY, radius, mass, first, second, width, height):
+	"""
+	Bounces pairs of balls kept in arrays, one pair at a time, in order.
+
+	Each pair is checked again before bouncing it, because the previous pairs
+	may have pushed its balls apart (like EnemyStore.bounceBalls). This loop
+	is only fast when compiled.
+
+	@param first: array with the index of the 1st ball of each pair.
+	@param second: array with the index of the 2nd ball of each pair.
+	"""
+	for k in range(len(first)):
+		i, j = first[k], second[k]
+		deltaX, deltaY = x[i] - x[j], y[i] - y[j]
+		radii = radius[i] + radius[j]
+		if deltaX * deltaX + deltaY * deltaY < radii * radii:
+			x[i], y[i], speedX[i], speedY[i], x[j], y[j], speedX[j], speedY[j] = \
+				_bounce(x[i], y[i], speedX[i], speedY[i], radius[i], mass[i],
+				        x[j], y[j], speedX[j], speedY[j], radius[j], mass[j],
+				        width, height)
@@ -14,36 +14,16 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import configparser, os, sys
+import atexit, configparser, io, os, sys, threading
+from collections import namedtuple
 from gettext import gettext as _
 
+from .files import writeAtomically
 
-class Options:
-	"""Holds the game options."""
-	# Game version
-	VERSION = "1.0.0"
-
-	# Names of the multiple-choice options
-	TYPE_NAMES = _("Time"), _("Coins")
-	DIFFICULTY_NAMES = _("Easy"), _("Medium"), _("Hard")
-
-	# Values of the multiple-choice options
-	TIME, COINS = 0, 1
-	EASY, MEDIUM, HARD = 0, 1, 2
-
-	# Parameters that depend on difficulty
-	ENEMY_SPEED = 200, 300, 400  # Initial enemy balls speed
-	INTERVAL_ADD_ENEMY = 15, 15, 15  # Interval between enemy balls additions
-	COINS_ADD_ENEMY = 10, 10, 10  # Coins needed to add a new enemy ball
 
-	# Other constants
-	BACKGROUND_COLOR = (192, 192, 192, 255)
-	FONT_COLOR = (0, 0, 0, 255)
-	FONT_COLOR_NOT_SELECTED = (92, 92, 92, 255)
-	FONT_NAME = "Ubuntu"
-
-	def __init__(self):
-		self._readConfig()  # Read the config file
+class _GameParameters:
+	"""Methods that depend on the type and difficulty (of Options and GameOptions)."""
+	__slots__ = ()
 
 	def isTime(self):
 		return self.type == Options.TIME
@@ -69,6 +49,55 @@ class Options:
 	def getCoinsAddEnemy(self):
 		return Options.COINS_ADD_ENEMY[self.difficulty]
 
+
+class Options(_GameParameters):
+	"""
+	Holds the game options.
+
+	The options are read from (and saved to) the config file each time they're
+	accessed, so the game uses a GameOptions snapshot instead.
+	"""
+	# Game version
+	VERSION = "1.0.0"
+
+	# Names of the multiple-choice options
+	TYPE_NAMES = _("Time"), _("Coins")
+	DIFFICULTY_NAMES = _("Easy"), _("Medium"), _("Hard")
+
+	# Values of the multiple-choice options
+	TIME, COINS = 0, 1
+	EASY, MEDIUM, HARD = 0, 1, 2
+
+	# Parameters that depend on difficulty
+	ENEMY_SPEED = 200, 300, 400  # Initial enemy balls speed
+	INTERVAL_ADD_ENEMY = 15, 15, 15  # Interval between enemy balls additions
+	COINS_ADD_ENEMY = 10, 10, 10  # Coins needed to add a new enemy ball
+
+	# Updates per second of the game physics (allowed range and default)
+	MIN_TICK_RATE, MAX_TICK_RATE, DEFAULT_TICK_RATE = 20, 240, 60
+
+	# How the enemies that collide are found (see GameEngine; the 1st is the default)
+	BROADPHASES = "grid", "sap"
+
+	# Other constants
+	BACKGROUND_COLOR = (192, 192, 192, 255)
+	FONT_COLOR = (0, 0, 0, 255)
+	FONT_COLOR_NOT_SELECTED = (92, 92, 92, 255)
+	FONT_NAME = "Ubuntu"
+	SAVE_DELAY = 0.5  # seconds without changes before the options are saved
+
+	def __init__(self):
+		self._readConfig()  # Read the config file
+		self._lock = threading.Lock()  # protects the config and the timer
+		self._saveLock = threading.Lock()  # only one save at a time
+		self._saveTimer = None  # timer of the pending save
+		atexit.register(self.flush)  # save the pending changes on exit
+
+	def snapshot(self):
+		"""Returns a GameOptions with the current values of the options."""
+		return GameOptions(self.type, self.difficulty, self.fullscreen,
+		                   self.tickRate, self.broadphase, self.ballsCollide, self.bonuses)
+
 	@staticmethod
 	def getUserConfigFolder():
 		"""Returns the path to the user's .config or AppData/Local folder."""
@@ -95,8 +124,7 @@ class Options:
 
 	@type.setter
 	def type(self, value):
-		self._config["Options"]["type"] = str(value)
-		self._saveConfig()
+		self._setOption("type", str(value))
 
 	@property
 	def difficulty(self):
@@ -106,8 +134,7 @@ class Options:
 
 	@difficulty.setter
 	def difficulty(self, value):
-		self._config["Options"]["difficulty"] = str(value)
-		self._saveConfig()
+		self._setOption("difficulty", str(value))
 
 	@property
 	def fullscreen(self):
@@ -115,8 +142,20 @@ class Options:
 
 	@fullscreen.setter
 	def fullscreen(self, value):
-		self._config["Options"]["fullscreen"] = "yes" if value else "no"
-		self._saveConfig()
+		self._setOption("fullscreen", "yes" if value else "no")
+
+	@property
+	def tickRate(self):
+		value = self._config.getint("Options", "tick_rate",
+		                            fallback=Options.DEFAULT_TICK_RATE)
+		# Ensure the value is valid
+		return min(max(value, Options.MIN_TICK_RATE), Options.MAX_TICK_RATE)
+
+	@property
+	def broadphase(self):
+		value = self._config.get("Options", "broadphase", fallback=Options.BROADPHASES[0])
+		# Ensure the value is valid
+		return value if value in Options.BROADPHASES else Options.BROADPHASES[0]
 
 	@property
 	def ballsCollide(self):
@@ -136,7 +175,40 @@ class Options:
 		if not "Options" in self._config.sections():
 			self._config["Options"] = {}
 
-	def _saveConfig(self):
-		os.makedirs(self._configDir, exist_ok=True)
-		with open(self._configFilename, "w") as file:
-			self._config.write(file)
+	def flush(self):
+		"""Saves the options now, if they were changed since the last save."""
+		with self._saveLock:
+			with self._lock:
+				if self._saveTimer is None:
+					return  # nothing to save
+				self._saveTimer.cancel()
+				self._saveTimer = None
+				text = io.StringIO()
+				self._config.write(text)
+
+			try:
+				writeAtomically(self._configFilename, text.getvalue())
+			except OSError as e:
+				print(_("Failed to save the options: {}").format(e), file=sys.stderr)
+
+	def _setOption(self, key, value):
+		"""Changes an option, and saves the options after SAVE_DELAY with no changes."""
+		with self._lock:
+			self._config["Options"][key] = value
+			if self._saveTimer is not None:
+				self._saveTimer.cancel()
+			self._saveTimer = threading.Timer(Options.SAVE_DELAY, self.flush)
+			self._saveTimer.daemon = True  # flush() is also called on exit
+			self._saveTimer.start()
+
+
+class GameOptions(_GameParameters, namedtuple("GameOptions", "type difficulty fullscreen "
+                                                             "tickRate broadphase "
+                                                             "ballsCollide bonuses")):
+	"""
+	An immutable snapshot of the options, taken when a game starts.
+
+	The options are plain attributes (of a tuple), so reading them in each
+	update is fast. Changing the Options doesn't change the snapshot.
+	"""
+	__slots__ = ()
@@ -0,0 +1,247 @@
+# Collision - A ball dodging game
+# Copyright (C) 2016 Bruno Nova <brunomb.nova@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Store of enemy balls that moves them in several processes.
+
+The arena is split in vertical strips, one per worker process. The arrays with
+the state of the balls are kept in shared memory, so the workers move and
+bounce the balls of their strips in place. The pairs of balls in different
+strips, and the pairs linked to them, are bounced by the main process (the
+boundary pass).
+
+The result is the same as with a NumpyEnemyStore: the pairs are bounced in the
+same order, and the groups of pairs that share balls are bounced by a single
+process.
+
+This is only worth it with thousands of balls: with fewer balls the store
+works like a NumpyEnemyStore, without the workers.
+"""
+
+import os, weakref
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy
+
+from .enemies import NumpyEnemyStore, findOverlappingPairs, moveBalls, resolvePairs
+
+__all__ = ["ParallelEnemyStore"]
+
+# Columns kept in shared memory (the ones used by the workers)
+_SHARED_COLUMNS = "x", "y", "speedX", "speedY", "radius", "mass", "enabled", "strip", "crossing"
+
+# Arrays of the shared memory blocks attached by a worker (name -> array)
+_attached = {}
+
+
+class ParallelEnemyStore(NumpyEnemyStore):
+	"""Stores the enemy balls in shared NumPy arrays, updating them in worker processes."""
+	NAME = "parallel"
+	MIN_BALLS = 2000  # minimum number of enabled balls to use the workers
+
+	COLUMNS = NumpyEnemyStore.COLUMNS + (("strip", int), ("crossing", bool))
+	strip = property(lambda self: self._strip[:self._size])  # strip of each ball
+	# Whether each ball overlaps a ball of another strip
+	crossing = property(lambda self: self._crossing[:self._size])
+
+	def __init__(self, workers=None):
+		"""
+		Creates an empty store.
+
+		@param workers: number of worker processes (and strips). By default,
+		                the number of CPUs.
+		"""
+		self.workers = workers or os.cpu_count() or 1
+		self._memory = {}  # column -> SharedMemory with its array
+		self._pools = []  # the pool of workers, started when there are enough balls
+		super().__init__()
+		self._finalizer = weakref.finalize(self, _release, self._memory, self._pools)
+
+	def update(self, dt, factor, arena):
+		if not self._useWorkers():
+			super().update(dt, factor, arena)
+			return
+
+		self._splitStrips(arena.width)
+		self._maxStep = max(self._run(_moveStrip, dt, factor, arena.width, arena.height))
+		self._updateEnableTimes(dt)
+
+	def bounceBalls(self, arena, broadphase=None):
+		"""
+		Bounces off one another all the enabled balls that overlap.
+
+		The main process first finds the pairs of balls in different strips
+		(only balls near the boundaries of the strips can be in one). Each
+		worker then finds the pairs of balls in its strip, and bounces the ones
+		that aren't linked to a pair in different strips (through pairs that
+		share balls). The main process bounces the others.
+
+		The pairs are bounced in the same order as NumpyEnemyStore.bounceBalls,
+		and the pairs that share balls are bounced by the same process, so the
+		result is the same.
+		"""
+		if not self._useWorkers():
+			super().bounceBalls(arena, broadphase)
+			return
+
+		bounds = self._splitStrips(arena.width)
+
+		# Pairs of balls in different strips
+		x, strip = self.x, self.strip
+		reach = 2 * self.radius.max()
+		near = (numpy.abs(x[:, numpy.newaxis] - bounds) < reach).any(axis=1)
+		first, second = findOverlappingPairs(x, self.y, self.radius, self.enabled & near)
+		across = strip[first] != strip[second]
+		first, second = first[across], second[across]
+		self.crossing[:] = False
+		self.crossing[first] = self.crossing[second] = True
+
+		# The workers return the pairs linked to the pairs in different strips
+		linked = self._run(_bounceStrip, arena.width, arena.height)
+		first = numpy.concatenate([first] + [pairs[0] for pairs in linked])
+		second = numpy.concatenate([second] + [pairs[1] for pairs in linked])
+		pairOrder = numpy.lexsort((second, first))
+		resolvePairs(self, first[pairOrder], second[pairOrder], arena.width, arena.height)
+
+	def close(self):
+		"""Stops the workers and frees the shared memory."""
+		self._finalizer()
+
+	def _useWorkers(self):
+		return self.workers > 1 and numpy.count_nonzero(self.enabled) >= ParallelEnemyStore.MIN_BALLS
+
+	def _splitStrips(self, width):
+		"""
+		Finds the strip of each ball (by its current position).
+
+		@param width: width of the arena.
+		@return: array with the x positions of the boundaries between the strips.
+		"""
+		bounds = numpy.arange(1, self.workers) * (width / self.workers)
+		self.strip[:] = numpy.searchsorted(bounds, self.x, side="right")
+		return bounds
+
+	def _run(self, function, *args):
+		"""
+		Calls a function in all workers (one per strip), and waits for them.
+
+		@return: list with the result of each worker.
+		"""
+		if not self._pools:
+			context = multiprocessing.get_context("spawn")
+			self._pools.append(ProcessPoolExecutor(self.workers, mp_context=context))
+
+		names = {column: memory.name for column, memory in self._memory.items()}
+		capacity, size = len(self._x), len(self)
+		futures = [self._pools[0].submit(function, names, capacity, size, strip, *args)
+		           for strip in range(self.workers)]
+		return [future.result() for future in futures]  # raises the errors of the workers
+
+	def _allocate(self, capacity):
+		old = dict(self._memory)
+		super()._allocate(capacity)
+		_release(old, [])  # the old arrays were copied to the new blocks
+
+	def _newArray(self, name, capacity, dtype):
+		if name not in _SHARED_COLUMNS:
+			return super()._newArray(name, capacity, dtype)
+		itemSize = numpy.dtype(dtype).itemsize
+		memory = shared_memory.SharedMemory(create=True, size=capacity * itemSize)
+		self._memory[name] = memory
+		array = numpy.ndarray(capacity, dtype=dtype, buffer=memory.buf)
+		array[:] = 0
+		return array
+
+
+def _release(memory, pools):
+	"""Stops the worker pools and frees the shared memory blocks."""
+	for pool in pools:
+		pool.shutdown()
+	pools.clear()
+	for block in memory.values():
+		try:
+			block.close()
+		except BufferError:
+			pass  # an array still uses it; freed when the array is
+		block.unlink()
+	memory.clear()
+
+def _attach(names, capacity, size):
+	"""
+	Gets the arrays of the store in a worker process.
+
+	@param names: dict with the column names as keys, and the names of their
+	              shared memory blocks as values.
+	@param capacity: length of the arrays.
+	@param size: number of balls in the store.
+	@return: object with the arrays (of length size) as attributes.
+	"""
+	balls = _Balls()
+	for column, name in names.items():
+		if name not in _attached:
+			# The workers share the resource tracker of the main process, which
+			# unlinks the block
+			memory = shared_memory.SharedMemory(name=name)
+			dtype = dict(ParallelEnemyStore.COLUMNS)[column]
+			_attached[name] = memory, numpy.ndarray(capacity, dtype=dtype, buffer=memory.buf)
+		setattr(balls, column, _attached[name][1][:size])
+
+	# Forget the blocks of old arrays (the store grew)
+	for name in set(_attached) - set(names.values()):
+		memory, array = _attached.pop(name)
+		del array
+		memory.close()
+	return balls
+
+def _moveStrip(names, capacity, size, strip, dt, factor, width, height):
+	"""
+	Moves the enabled balls of a strip (runs in a worker).
+
+	@return: the longest distance moved by a ball.
+	"""
+	balls = _attach(names, capacity, size)
+	indices = numpy.flatnonzero(balls.enabled & (balls.strip == strip))
+	return moveBalls(balls, indices, dt, factor, width, height)
+
+def _bounceStrip(names, capacity, size, strip, width, height):
+	"""
+	Bounces the overlapping balls of a strip (runs in a worker).
+
+	The pairs linked to a ball that overlaps a ball of another strip (through
+	pairs that share balls) aren't bounced, but returned.
+
+	@return: tuple (first, second) with the arrays of the linked pairs.
+	"""
+	balls = _attach(names, capacity, size)
+	inStrip = balls.enabled & (balls.strip == strip)
+	first, second = findOverlappingPairs(balls.x, balls.y, balls.radius, inStrip)
+
+	# Spread the crossing balls through the pairs, until no new ball is reached
+	linkedBalls = balls.crossing.copy()
+	count = -1
+	while count != numpy.count_nonzero(linkedBalls):
+		count = numpy.count_nonzero(linkedBalls)
+		linked = linkedBalls[first] | linkedBalls[second]
+		linkedBalls[first[linked]] = linkedBalls[second[linked]] = True
+
+	resolvePairs(balls, first[~linked], second[~linked], width, height)
+	return first[linked], second[linked]
+
+
+class _Balls:
+	"""The arrays of a store, as seen by a worker."""
@@ -0,0 +1,79 @@
+# Collision - A ball dodging game
+# Copyright (C) 2016 Bruno Nova <brunomb.nova@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Cache of the images of the balls.
+
+The images (and the frames of the coin animation) are decoded only once, and
+packed into a single texture atlas. The sprites get regions of that texture,
+so the same texture is bound to draw all the balls.
+"""
+
+import pyglet
+
+__all__ = ["load", "image", "coinAnimation"]
+
+BALL_IMAGES = ("bonus.png", "enemy.png", "missile.png", "player.png",
+               "player_frozen.png", "player_invulnerable.png")
+COIN_IMAGE = "coin.png"  # sheet with the frames of the coin animation
+COIN_FRAMES = 61
+COIN_FRAME_DURATION = 0.02
+ATLAS_SIZE = 512  # width and height of the atlas (fits 225 balls with borders)
+BORDER = 1  # empty pixels around each image (to avoid bleeding when filtered)
+
+_atlas = None
+_images = {}  # name -> region of the atlas
+_coinAnimation = None
+
+
+def load():
+	"""
+	Decodes the images and packs them into the atlas, if not done yet.
+
+	Needs an OpenGL context (a window must have been created).
+	"""
+	global _atlas, _coinAnimation
+	if _atlas is not None:
+		return
+
+	atlas = pyglet.image.atlas.TextureAtlas(ATLAS_SIZE, ATLAS_SIZE)
+	for name in BALL_IMAGES:
+		_images[name] = atlas.add(_decode(name), BORDER)
+
+	frames = pyglet.image.ImageGrid(_decode(COIN_IMAGE), 1, COIN_FRAMES)
+	_coinAnimation = pyglet.image.Animation.from_image_sequence(
+		[atlas.add(frame, BORDER) for frame in frames], COIN_FRAME_DURATION)
+	_atlas = atlas
+
+def image(name):
+	"""
+	Returns the image of a ball (a region of the atlas).
+
+	@param name: file name of the image (one of BALL_IMAGES).
+	@return: the image.
+	"""
+	load()
+	return _images[name]
+
+def coinAnimation():
+	"""Returns the coin animation (shared by all coins)."""
+	load()
+	return _coinAnimation
+
+def _decode(name):
+	"""Decodes an image of the resource path, without creating a texture."""
+	with pyglet.resource.file(name) as file:
+		return pyglet.image.load(name, file=file)
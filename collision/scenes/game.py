@@ -14,11 +14,9 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import random
 from cocos.actions import FadeOut, CallFunc
-from cocos.collision_model import CollisionManagerGrid
+from cocos.batch import BatchNode
 from cocos.director import director
-from cocos.euclid import Vector2
 from cocos.layer import Layer, ColorLayer
 from cocos.scene import Scene
 from cocos.text import Label
@@ -30,9 +28,9 @@ from .gameOver import GameOverScene
 from .pause import PauseScene
 from .quit import QuitScene
 from ..balls import *
-from ..options import Options
-from ..scores import Scores
-from ..timer import Timer
+from ..engine import GameEngine, GameListener
+from ..options import GameOptions, Options
+from ..scores import createScores
 
 
 class GameScene(Scene):
@@ -41,9 +39,9 @@ class GameScene(Scene):
 		"""
 		Creates the scene.
 
-		@param options: game options.
+		@param options: game options (a snapshot is used during the game).
 		"""
-		gameLayer = GameLayer(options)
+		gameLayer = GameLayer(options.snapshot())
 		hudLayer = HUDLayer(gameLayer)
 		super().__init__(gameLayer, hudLayer)
 
@@ -67,82 +65,91 @@ class HUDLayer(Layer):
 		self.enemies.position = winSize[0] - 10, winSize[1] - 10  # top right
 		self.add(self.enemies)
 
-		self.schedule(self.update)
-
-	def update(self, dt):
+		# Translated texts (looked up once) and values shown in the labels
 		if self.gameLayer.options.isTime():
-			self.score.element.text = _("Time: {}").format(int(self.gameLayer.time))
+			self.scoreText = _("Time: {}")
 		else:
-			self.score.element.text = _("Coins: {}").format(self.gameLayer.coins)
-		self.enemies.element.text = _("Balls: {}").format(self.gameLayer.getNumberOfEnemies())
+			self.scoreText = _("Coins: {}")
+		self.enemiesText = _("Balls: {}")
+		self.shownScore = self.shownEnemies = None
 
+		self.schedule(self.update)
 
-class GameLayer(ColorLayer):
-	"""Layer that shows and controls the actual game."""
+	def update(self, dt):
+		# Only change the labels when the values change (changing the text of a
+		# label lays it out again)
+		score = self.gameLayer.engine.getScore()
+		if score != self.shownScore:
+			self.shownScore = score
+			self.score.element.text = self.scoreText.format(score)
+		enemies = self.gameLayer.getNumberOfEnemies()
+		if enemies != self.shownEnemies:
+			self.shownEnemies = enemies
+			self.enemies.element.text = self.enemiesText.format(enemies)
+
+
+class GameLayer(ColorLayer, GameListener):
+	"""Layer that shows and controls the actual game (simulated by a GameEngine)."""
 	is_event_handler = True
 
-	def __init__(self, options: Options):
+	def __init__(self, options: GameOptions):
 		"""
 		Creates the layer.
 
-		@param options: game options.
+		@param options: snapshot of the game options.
 		"""
 		super().__init__(*Options.BACKGROUND_COLOR)
 
 		self.options = options
 		self.keysPressed = set()
-		self.enemies = []
-		self.isGameOver = False
-		self.time = 0
-		self.coins = 0
-		self.mouseDelta = Vector2(0, 0)
-
-		# Set timers (all timers count down)
-		self.timers = dict()
-		if self.options.isTime():
-			# Timer to add new enemy
-			self.timers["addEnemy"] = Timer(options.getIntervalAddEnemy(),
-			                                callback=self.onAddEnemyTimer)
-		if self.options.bonuses:
-			# Timers related to bonuses
-			self.timers["showBonus"] = Timer(random.randint(3, 10),
-			                                 callback=self.onShowBonusTimer,
-			                                 cond=lambda: not self.bonus.enabled,
-											 min_=3, max_=10)
-			self.timers["speedDown"] = Timer()
-			self.timers["speedUp"] = Timer()
-			self.timers["freeze"] = Timer()
-			self.timers["freezePlayer"] = Timer(callback=self.onFreezePlayerTimer)
-			self.timers["invulnerable"] = Timer(callback=self.onInvulnerableTimer)
-			self.timers["missile"] = Timer(callback=self.onMissileTimer)
+		self.enemies = []  # sprites of the enemy balls
 
-		# Create player ball
+		# The previous game is over, so its sprites can be reused
+		ballPool.recycle()
+
+		# All balls are drawn with a single batch (the z of a ball is the order
+		# of its group in the batch)
+		self.balls = BatchNode()
+		self.add(self.balls)
+
+		# Create the engine (creating the enemy sprites through onEnemyAdded)
 		width, height = director.get_window_size()
-		self.player = Player(width // 2, height // 2)
-		self.add(self.player, z=0.3)
+		self.engine = GameEngine(options, width, height, listener=self,
+		                         broadphase=options.broadphase, tickRate=options.tickRate)
 
-		# Create enemy balls
-		for x in range(3):
-			self.addEnemy()
+		# Create player ball
+		self.player = ballPool.acquire(Player, self.engine.player)
+		self.balls.add(self.player, z=0.3)
+		self.balls.add(self.player.invulnerableSprite, z=0.4)
 
 		if self.options.isCoins():
 			# Create coin
-			self.coin = Coin(self.player.x, self.player.y)
-			self.add(self.coin, z=0.2)
+			self.coin = ballPool.acquire(Coin, self.engine.coin)
+			self.balls.add(self.coin, z=0.2)
 
 		if self.options.bonuses:
 			# Create bonus
-			self.bonus = Bonus()
-			self.add(self.bonus, z=0.0)
+			self.bonus = ballPool.acquire(Bonus, self.engine.bonus)
+			self.balls.add(self.bonus, z=0.0)
 
 			# Create missile
-			self.missile = Missile()
-			self.add(self.missile, z=0.2)
+			self.missile = ballPool.acquire(Missile, self.engine.missile)
+			self.balls.add(self.missile, z=0.2)
 
-		self.collMan = CollisionManagerGrid(0, self.width, 0, self.height,
-		                                    self.player.radius, self.player.radius)
 		self.schedule(self.update)
 
+	@property
+	def isGameOver(self):
+		return self.engine.isGameOver
+
+	@property
+	def time(self):
+		return self.engine.time
+
+	@property
+	def coins(self):
+		return self.engine.coins
+
 	def on_enter(self):
 		super().on_enter()
 		director.window.set_exclusive_mouse(True)  # "grab" the mouse
@@ -151,31 +158,9 @@ class GameLayer(ColorLayer):
 		super().on_exit()
 		director.window.set_exclusive_mouse(False)  # "free" the mouse
 
-	def addEnemy(self):
-		"""
-		Adds a new enemy ball.
-
-		@return: the added ball.
-		"""
-		speed = self.options.getEnemySpeed()
-		enemy = Enemy(self.player.x, self.player.y, speed)
-		self.enemies.append(enemy)
-		self.add(enemy, z=0.1)
-		return enemy
-
-	def gameOver(self):
-		self.isGameOver = True
-
-		# Fade out player ball and exit scene when done
-		self.player.do((FadeOut(2)) + CallFunc(self._gameOver))
-
-		# Stop actions of enemy balls
-		for enemy in self.enemies:
-			enemy.stop()
-
 	def getNumberOfEnemies(self):
 		"""Returns the number of enemy balls."""
-		return len(self.enemies)
+		return self.engine.getNumberOfEnemies()
 
 	def pauseGame(self):
 		"""Pauses the game."""
@@ -187,131 +172,58 @@ class GameLayer(ColorLayer):
 		if not self.isGameOver:
 			director.push(QuitScene())
 
-	def giveBonus(self):
-		"""Gives a random advantage or disadvantage to the player."""
+	def onEnemyAdded(self, enemy):
+		sprite = ballPool.acquire(Enemy, enemy)
+		self.enemies.append(sprite)
+		self.balls.add(sprite, z=0.1)
+
+	def onBonusShown(self, bonus):
+		self.bonus.show()
+
+	def onBonusHidden(self, bonus):
 		self.bonus.hide()
 
-		# Select the bonus
-		bonus = random.randint(0, 5)
-		if bonus == 0:  # speed down enemy balls
-			self.timers["speedUp"].time = 0
-			self.timers["speedDown"].time = 6
-			self.timers["freeze"].time = 0
-		elif bonus == 1:  # speed up enemy balls
-			self.timers["speedUp"].time = 3
-			self.timers["speedDown"].time = 0
-			self.timers["freeze"].time = 0
-		elif bonus == 2:  # freeze enemy balls
-			self.timers["speedUp"].time = 0
-			self.timers["speedDown"].time = 0
-			self.timers["freeze"].time = 5
-		elif bonus == 3:  # freeze player ball
-			self.timers["freezePlayer"].time = 0.6
-			self.player.freeze()
-		elif bonus == 4:  # player invulnerability
-			self.timers["invulnerable"].time = 6
-			self.player.makeInvulnerable()
-		else:  # missile
-			self.timers["missile"].time = 5
-			self.missile.show(self.player.x, self.player.y)
-
-	def isSpeedDown(self):
-		return self.options.bonuses and self.timers["speedDown"].time > 0
-
-	def isSpeedUp(self):
-		return self.options.bonuses and self.timers["speedUp"].time > 0
-
-	def isFreeze(self):
-		return self.options.bonuses and self.timers["freeze"].time > 0
-
-	def onAddEnemyTimer(self, timer):
-		timer.time += self.options.getIntervalAddEnemy()
-		self.addEnemy()
-
-	def onShowBonusTimer(self, timer, min_, max_):
-		timer.time = random.randint(min_, max_)
-		self.bonus.show(self.player.x, self.player.y)
-
-	def onFreezePlayerTimer(self, timer):
+	def onMissileShown(self, missile):
+		self.missile.show()
+
+	def onMissileHidden(self, missile):
+		self.missile.hide()
+
+	def onPlayerFrozen(self, player):
+		self.player.freeze()
+
+	def onPlayerUnfrozen(self, player):
 		self.player.unfreeze()
 
-	def onInvulnerableTimer(self, timer):
+	def onPlayerInvulnerable(self, player):
+		self.player.makeInvulnerable()
+
+	def onPlayerVulnerable(self, player):
 		self.player.makeVulnerable()
 
-	def onMissileTimer(self, timer):
-		self.missile.hide()
+	def onGameOver(self):
+		# Fade out player ball and exit scene when done
+		self.player.do((FadeOut(2)) + CallFunc(self._gameOver))
+
+		# Stop actions of enemy balls
+		for enemy in self.enemies:
+			enemy.stop()
 
 	def update(self, dt):
 		if not self.isGameOver:
-			self.time += dt  # count total game time
-			self.collMan.clear()
-
-			# Update player ball
-			self.player.update(dt, self.mouseDelta, self.keysPressed)
-			self.mouseDelta = Vector2(0, 0)
-			self.collMan.add(self.player)
-
-			# Determine factor to multiply enemy balls speed by
-			if self.isSpeedDown():
-				factor = 0.5
-			elif self.isSpeedUp():
-				factor = 1.5
-			elif self.isFreeze():
-				factor = 0.0
-			else:
-				factor = 1.0
-
-			# Update enemy balls
-			for enemy in self.enemies:
-				enemy.update(dt, factor)
-				if enemy.enabled:
-					self.collMan.add(enemy)
-
-			# Update missile
-			if self.options.bonuses:
-				self.missile.update(dt, self.player.x, self.player.y)
-
-			# Check collision between player and coin
-			if self.options.isCoins() and self.coin.enabled:
-				self.collMan.add(self.coin)
-				if self.collMan.they_collide(self.player, self.coin):
-					self.coins += 1
-					# Move the coin to a random position
-					self.coin.setRandomPosition(self.player.x, self.player.y,
-					                            Coin.PLAYER_DISTANCE)
-					if self.coins % self.options.getCoinsAddEnemy() == 0:
-						self.addEnemy()  # add an enemy every N coins
-
+			self.engine.setKeyDirection(*GameLayer._keyboardDelta(self.keysPressed))
+			alpha = self.engine.advance(dt)
+
+			# Move the sprites to the positions of the balls (interpolated
+			# between the last two updates of the engine)
+			self.player.sync(alpha)
+			for enemy, position in zip(self.enemies, self.engine.enemies.positions(alpha)):
+				enemy.position = position
+			if self.options.isCoins():
+				self.coin.sync(alpha)
 			if self.options.bonuses:
-				# Check collision between player and bonus
-				if self.bonus.enabled:
-					self.collMan.add(self.bonus)
-					if self.collMan.they_collide(self.player, self.bonus):
-						self.giveBonus()
-
-				# Check collision between player and missile
-				if self.missile.enabled and not self.player.isInvulnerable():
-					self.collMan.add(self.missile)
-					if self.collMan.they_collide(self.player, self.missile):
-						self.gameOver()
-
-			# Check collisions between player and enemies
-			if not self.player.isInvulnerable():
-				for enemy in self.enemies:
-					if enemy.enabled and self.collMan.they_collide(self.player, enemy):
-						self.gameOver()
-
-			# Check collisions between enemies
-			if self.options.ballsCollide:
-				for i, enemy in enumerate(self.enemies):
-					for j, other in enumerate(self.enemies):
-						if j > i and enemy.enabled and other.enabled \
-						   and self.collMan.they_collide(enemy, other):
-							Enemy.bounceBalls(enemy, other)
-
-			# Update timers
-			for timer in self.timers.values():
-				timer.update(dt)
+				self.bonus.sync(alpha)
+				self.missile.sync(alpha)
 
 	def on_key_press(self, key, modifiers):
 		self.keysPressed.add(key)
@@ -327,14 +239,38 @@ class GameLayer(ColorLayer):
 			self.keysPressed.remove(key)
 
 	def on_mouse_motion(self, x, y, dx, dy):
-		self.mouseDelta += Vector2(dx, dy)
+		self.engine.moveMouse(dx, dy)
 
 	def _gameOver(self):
-		score = int(self.time) if self.options.type == Options.TIME else self.coins
+		score = self.engine.getScore()
 
-		highScores = Scores()
+		highScores = createScores()
 		if highScores.isHighScore(self.options.type, self.options.difficulty, score):
 			director.push(GameOverScene(score, self.getNumberOfEnemies(),
 			                            self.options, highScores))
 		else:
+			highScores.addGame(self.options.type, self.options.difficulty, score)
 			director.pop()
+
+	@staticmethod
+	def _keyboardDelta(keysPressed):
+		"""
+		Returns the direction the arrow keys are pressed.
+
+		Each coordinate will have the value -1, 0 or 1.
+
+		@param keysPressed: the keys currently held down.
+		@return: tuple (x, y) with the direction of the arrow keys pressed.
+		"""
+		x, y = 0, 0
+
+		if window.key.LEFT in keysPressed:
+			x -= 1
+		if window.key.RIGHT in keysPressed:
+			x += 1
+		if window.key.UP in keysPressed:
+			y += 1
+		if window.key.DOWN in keysPressed:
+			y -= 1
+
+		return x, y
@@ -64,6 +64,9 @@ class GameOverLayer(CustomizedMenu):
 			self.on_quit()
 
 	def on_quit(self):
+		# The high score isn't added without a name, but the game is still recorded
+		self.highScores.addGame(self.options.type, self.options.difficulty, self.score)
+
 		# Pop 2 scenes (the current Game Over scene and the Game scene)
 		director.pop()
 		director.pop()
@@ -23,7 +23,7 @@ from gettext import gettext as _
 from cocos.text import Label
 
 from ..options import Options
-from ..scores import Scores
+from ..scores import createScores
 from ..util import CustomizedMenu, MultiMenuItem
 
 
@@ -55,7 +55,7 @@ class MenuLayer(CustomizedMenu):
 		self.type = self.options.type
 		self.difficulty = self.options.difficulty
 		self.scoresLayer = scoresLayer
-		self.scores = Scores()
+		self.scores = createScores()
 
 		# Create the items
 		items = [
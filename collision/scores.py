@@ -14,19 +14,73 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import json, os, sys
+"""
+Stores of the high scores.
+
+The "json" store keeps the best scores of each type and difficulty in a JSON
+file. The "sqlite" store keeps every game in a SQLite database, so it can also
+tell the rank, percentile, personal best and daily bests of a score. SQLite is
+optional: if the sqlite3 module isn't available, the "sqlite" store isn't
+either. The store is chosen with the COLLISION_SCORES environment variable
+("json" by default).
+"""
+
+import json, os, sys, threading, time
+from contextlib import contextmanager
 from gettext import gettext as _
 
+from .files import BackgroundWriter
 from .options import Options
 
+try:
+	import sqlite3
+except ImportError:
+	sqlite3 = None
+
+__all__ = ["Scores", "SqliteScores", "BACKENDS", "createScores"]
+
 
 class Scores:
-	"""Stores, loads and handles the high scores."""
+	"""
+	Stores, loads and handles the high scores, in a JSON file.
+
+	The scores are loaded once and shared by all instances. They're only loaded
+	again when the modification time or size of the file changes (another
+	instance of the game saved it). They're saved in a background thread.
+
+	Several instances of the game may add scores at the same time. So the new
+	scores are kept until they're saved, and then added to the scores of the
+	file while it's locked (the file is read, merged and written under the
+	lock, so the scores added by the other instances are kept).
+	"""
+	NAME = "json"
 	MAX_HIGH_SCORES = 5  # Maximum number of high scores, per type and difficulty.
 
+	# Loaded scores, shared by all instances (file name -> [stamp, scores])
+	_cache = {}
+	_added = {}  # scores not saved yet (file name -> list of (type, difficulty, name, score))
+	_saving = {}  # scores being saved (file name -> list, like _added)
+	_lock = threading.RLock()  # protects the above (the scores are merged in the writer)
+	_writer = BackgroundWriter()  # saves the files (pending saves are done on exit)
+
 	def __init__(self):
-		self.scores = {}
-		self._loadScores()
+		self._scoresDir = Options.getUserDataFolder()
+		self._filename = os.path.join(self._scoresDir, "scores.json")
+
+	@property
+	def scores(self):
+		"""The high scores (a dict of dicts of lists), loaded if the file changed."""
+		with Scores._lock:
+			cached = Scores._cache.get(self._filename)
+			if cached is not None and Scores._writer.isPending(self._filename):
+				return cached[1]  # not saved yet, so newer than the file
+			stamp = self._fileStamp()
+			if cached is None or cached[0] != stamp:
+				scores = self._loadScores()
+				for entry in Scores._added.get(self._filename, []):  # not saved yet
+					Scores._insertScore(scores, *entry)
+				cached = Scores._cache[self._filename] = [stamp, scores]
+			return cached[1]
 
 	def getHighScores(self, type, difficulty):
 		type, difficulty = str(type), str(difficulty)  # convert params to strings
@@ -48,15 +102,30 @@ class Scores:
 
 	def addHighScore(self, type, difficulty, name, score):
 		type, difficulty = str(type), str(difficulty)  # convert params to strings
+		with Scores._lock:
+			Scores._insertScore(self.scores, type, difficulty, name, score)
+			Scores._added.setdefault(self._filename, []).append((type, difficulty, name, score))
+		self._saveScores()  # save scores to disk (in the background)
+
+	def addGame(self, type, difficulty, score):
+		"""
+		Records a finished game that isn't a high score.
 
+		Only the high scores are kept in the JSON file, so this does nothing.
+		"""
+		pass
+
+	@staticmethod
+	def _insertScore(allScores, type, difficulty, name, score):
+		"""Adds a score to the high scores (a dict of dicts of lists), if it's one."""
 		# Create the dicts for type and difficulty if they don't exist
-		if not type in self.scores:
-			self.scores[type] = {}
-		if not difficulty in self.scores[type]:
-			self.scores[type][difficulty] = []
+		if not type in allScores:
+			allScores[type] = {}
+		if not difficulty in allScores[type]:
+			allScores[type][difficulty] = []
 
 		# Add the score to the list of high scores
-		scores = self.scores[type][difficulty]
+		scores = allScores[type][difficulty]
 		scoreDict = {"name": name, "score": score}
 		for i, s in enumerate(scores):
 			if score > s["score"]:
@@ -71,25 +140,288 @@ class Scores:
 			if len(scores) < Scores.MAX_HIGH_SCORES:
 				scores.append(scoreDict)
 
-		self._saveScores()  # save scores to disk
-
-	def _loadScores(self):
-		self._scoresDir = Options.getUserDataFolder()
-		filename = os.path.join(self._scoresDir, "scores.json")
+	def _fileStamp(self):
+		"""Returns the modification time and size of the file (None if it doesn't exist)."""
+		try:
+			stat = os.stat(self._filename)
+		except OSError:
+			return None
+		return stat.st_mtime_ns, stat.st_size
 
+	def _loadScores(self, filename=None):
+		filename = filename or self._filename
 		try:
 			if os.path.exists(filename):
 				with open(filename, "r") as file:
-					self.scores = json.load(file)
+					return json.load(file)
 		except Exception as e:
 			print(_("Failed to load high scores: {}").format(e), file=sys.stderr)
+		return {}
 
 	def _saveScores(self):
-		filename = os.path.join(self._scoresDir, "scores.json")
+		Scores._writer.write(self._filename, self._mergeScores, self._onSaved)
+
+	def _mergeScores(self):
+		"""
+		Adds the new scores to the scores of the file.
+
+		Called by the writer while the file is locked.
+
+		@return: the text of the merged scores, to be saved.
+		"""
+		with Scores._lock:
+			added = Scores._saving[self._filename] = Scores._added.pop(self._filename, [])
+		scores = self._loadScores()
+		for entry in added:
+			Scores._insertScore(scores, *entry)
+		text = json.dumps(scores)
+
+		# Keep the merged scores, with the scores added meanwhile (saved next)
+		with Scores._lock:
+			for entry in Scores._added.get(self._filename, []):
+				Scores._insertScore(scores, *entry)
+			Scores._cache[self._filename] = [None, scores]
+		return text
+
+	def _onSaved(self, error):
+		"""Called (in the writer thread) after saving the scores (the file is still locked)."""
+		with Scores._lock:
+			saved = Scores._saving.pop(self._filename, [])
+			if error is not None:
+				print(_("Failed to save high scores: {}").format(error), file=sys.stderr)
+				# Keep the scores that weren't saved (they're saved with the next ones)
+				Scores._added[self._filename] = saved + Scores._added.get(self._filename, [])
+			else:
+				# The saved file has the cached scores, so don't load it again
+				Scores._cache[self._filename][0] = self._fileStamp()
+
+
+class SqliteScores(Scores):
+	"""
+	Stores every game in a SQLite database, and handles the high scores.
+
+	The database has an index on (type, difficulty, score), so the queries only
+	read the rows they need, even with millions of games. The scores of the
+	JSON file are copied to the database when it's created.
+
+	The games are saved in the background thread of the writer (waiting for
+	other instances of the game that are writing the database). Until they're
+	saved, the queries add them to the results.
+	"""
+	NAME = "sqlite"
+	VERSION = 1  # version of the database schema
+	TIMEOUT = 10  # seconds waiting for other instances writing the database
+	INSERT = "INSERT INTO scores (type, difficulty, name, score, time, day) VALUES (?, ?, ?, ?, ?, ?)"
+
+	# Open databases, shared by all instances (file name -> connection)
+	_connections = {}
+	_unsavedRows = {}  # games not saved yet (file name -> list of rows), protected by _lock
+
+	def __init__(self):
+		super().__init__()
+		self._jsonFilename = self._filename
+		self._filename = os.path.join(self._scoresDir, "scores.db")
+		if self._filename not in SqliteScores._connections:
+			SqliteScores._connections[self._filename] = self._open()
+		self._db = SqliteScores._connections[self._filename]
+
+	@property
+	def scores(self):
+		raise AttributeError("The SQLite store doesn't keep the scores in memory")
+
+	def getHighScores(self, type, difficulty):
+		with Scores._lock:
+			scores = self._db.execute(
+				"SELECT name, score FROM scores WHERE type = ? AND difficulty = ?"
+				" AND name IS NOT NULL ORDER BY score DESC, id LIMIT ?",
+				(str(type), str(difficulty), Scores.MAX_HIGH_SCORES)).fetchall()
+			scores += [(row[2], row[3]) for row in self._unsaved(type, difficulty)
+			           if row[2] is not None]
+		scores.sort(key=lambda score: -score[1])  # stable: the saved (older) scores first
+		return [{"name": name, "score": score}
+		        for name, score in scores[:Scores.MAX_HIGH_SCORES]]
+
+	def addHighScore(self, type, difficulty, name, score):
+		self._insert(type, difficulty, name, score)
+
+	def addGame(self, type, difficulty, score):
+		"""
+		Records a finished game that isn't a high score (it has no name).
+
+		@param type: type of the game.
+		@param difficulty: difficulty of the game.
+		@param score: score of the game.
+		"""
+		self._insert(type, difficulty, None, score)
+
+	def getRank(self, type, difficulty, score):
+		"""
+		Returns the rank of a score (1 is the best), among all the games.
+
+		@return: 1 plus the number of games with a better score.
+		"""
+		with Scores._lock:
+			better = self._db.execute(
+				"SELECT COUNT(*) FROM scores WHERE type = ? AND difficulty = ? AND score > ?",
+				(str(type), str(difficulty), score)).fetchone()[0]
+			better += sum(row[3] > score for row in self._unsaved(type, difficulty))
+		return 1 + better
+
+	def getPercentile(self, type, difficulty, score):
+		"""
+		Returns the percentage of games with a worse score.
+
+		@return: a number between 0 and 100 (0 if there are no games).
+		"""
+		with Scores._lock:
+			total, worse = self._db.execute(
+				"SELECT COUNT(*), TOTAL(score < ?) FROM scores WHERE type = ? AND difficulty = ?",
+				(score, str(type), str(difficulty))).fetchone()
+			unsaved = self._unsaved(type, difficulty)
+		total += len(unsaved)
+		worse += sum(row[3] < score for row in unsaved)
+		return 100 * worse / total if total > 0 else 0
+
+	def getPersonalBest(self, type, difficulty, name):
+		"""
+		Returns the best score of a player.
+
+		@param name: name of the player.
+		@return: the best score, or None if the player has no scores.
+		"""
+		with Scores._lock:
+			best = self._db.execute(
+				"SELECT MAX(score) FROM scores WHERE type = ? AND difficulty = ? AND name = ?",
+				(str(type), str(difficulty), name)).fetchone()[0]
+			scores = [row[3] for row in self._unsaved(type, difficulty) if row[2] == name]
+		if best is not None:
+			scores.append(best)
+		return max(scores) if scores else None
+
+	def getDailyBests(self, type, difficulty, days=7):
+		"""
+		Returns the best score of each of the last days with games.
+
+		@param days: maximum number of days returned.
+		@return: list of tuples (day, score), from the most recent day. The day
+		         is a "YYYY-MM-DD" string (in local time).
+		"""
+		with Scores._lock:
+			bests = dict(self._db.execute(
+				"SELECT day, MAX(score) FROM scores WHERE type = ? AND difficulty = ?"
+				" GROUP BY day ORDER BY day DESC LIMIT ?",
+				(str(type), str(difficulty), days)))
+			for row in self._unsaved(type, difficulty):
+				bests[row[5]] = max(bests.get(row[5], row[3]), row[3])
+		return sorted(bests.items(), reverse=True)[:days]
+
+	def _unsaved(self, type, difficulty):
+		"""Returns the rows of the games of a type and difficulty not saved yet."""
+		type, difficulty = str(type), str(difficulty)
+		return [row for row in SqliteScores._unsavedRows.get(self._filename, ())
+		        if row[0] == type and row[1] == difficulty]
+
+	def _insert(self, type, difficulty, name, score):
+		with Scores._lock:
+			rows = SqliteScores._unsavedRows.setdefault(self._filename, [])
+			rows.append(_row(type, difficulty, name, score, time.time()))
+		Scores._writer.run(self._filename, self._saveRows)
+
+	def _saveRows(self):
+		"""
+		Saves the games not saved yet (runs in the thread of the writer).
+
+		The games that fail to be saved are saved with the next ones.
+		"""
+		with Scores._lock:
+			rows = list(SqliteScores._unsavedRows.get(self._filename, ()))
+		if not rows:
+			return
+		try:
+			# The connection of the main thread can't be used in this thread
+			db = sqlite3.connect(self._filename, timeout=SqliteScores.TIMEOUT,
+			                     isolation_level=None)
+			try:
+				db.execute("BEGIN IMMEDIATE")
+				db.executemany(SqliteScores.INSERT, rows)
+				with Scores._lock:  # the queries don't see the rows twice
+					db.execute("COMMIT")
+					del SqliteScores._unsavedRows[self._filename][:len(rows)]
+			finally:
+				db.close()  # rolls back if not committed
+		except sqlite3.Error as e:
+			print(_("Failed to save high scores: {}").format(e), file=sys.stderr)
+
+	def _open(self):
+		"""Opens the database, creating it (and copying the JSON scores) if needed."""
 		os.makedirs(self._scoresDir, exist_ok=True)
+		db = sqlite3.connect(self._filename, timeout=SqliteScores.TIMEOUT, isolation_level=None)
+		db.execute("PRAGMA journal_mode = WAL")  # readers don't wait for writers
+		self._db = db
+		if db.execute("PRAGMA user_version").fetchone()[0] >= SqliteScores.VERSION:
+			return db  # already created (no need to lock it)
+		with self._transaction():
+			# Check again: another instance may have created it meanwhile
+			if db.execute("PRAGMA user_version").fetchone()[0] < SqliteScores.VERSION:
+				db.execute("CREATE TABLE IF NOT EXISTS scores (id INTEGER PRIMARY KEY,"
+				           " type TEXT NOT NULL, difficulty TEXT NOT NULL, name TEXT,"
+				           " score INTEGER NOT NULL, time REAL NOT NULL, day TEXT NOT NULL)")
+				db.execute("CREATE INDEX IF NOT EXISTS scoresByScore"
+				           " ON scores (type, difficulty, score DESC)")
+				db.execute("CREATE INDEX IF NOT EXISTS scoresByDay"
+				           " ON scores (type, difficulty, day, score)")
+				db.execute("CREATE INDEX IF NOT EXISTS scoresByName"
+				           " ON scores (name, type, difficulty, score)")
+				self._migrate()
+				db.execute("PRAGMA user_version = {}".format(SqliteScores.VERSION))
+		return db
 
+	def _migrate(self):
+		"""Copies the scores of the JSON file to the database (they're dated with the file)."""
 		try:
-			with open(filename, "w") as file:
-				json.dump(self.scores, file)
-		except Exception as e:
-			print(_("Failed to load high scores: {}").format(e), file=sys.stderr)
+			when = os.path.getmtime(self._jsonFilename)
+		except OSError:
+			return  # no JSON file
+		rows = [_row(type, difficulty, s["name"], s["score"], when)
+		        for type, difficulties in self._loadScores(self._jsonFilename).items()
+		        for difficulty, scores in difficulties.items()
+		        for s in scores]
+		self._db.executemany(SqliteScores.INSERT, rows)
+
+	@contextmanager
+	def _transaction(self):
+		"""Runs a block in a transaction that locks the database for writing."""
+		self._db.execute("BEGIN IMMEDIATE")
+		try:
+			yield
+		except BaseException:
+			self._db.execute("ROLLBACK")
+			raise
+		self._db.execute("COMMIT")
+
+
+def _row(type, difficulty, name, score, when):
+	"""Returns the values of a row of the scores table (for SqliteScores.INSERT)."""
+	day = time.strftime("%Y-%m-%d", time.localtime(when))
+	return str(type), str(difficulty), name, score, when, day
+
+
+BACKENDS = {Scores.NAME: Scores}
+if sqlite3 is not None:
+	BACKENDS[SqliteScores.NAME] = SqliteScores
+
+
+def createScores(backend=None):
+	"""
+	Creates a store of high scores.
+
+	@param backend: name of the store ("json" or "sqlite"). By default, the
+	                store named by the COLLISION_SCORES environment variable,
+	                or "json".
+	@return: the created store.
+	"""
+	if backend is None:
+		backend = os.environ.get("COLLISION_SCORES") or Scores.NAME
+	if backend not in BACKENDS:
+		raise ValueError("Unknown or unavailable scores backend: {}".format(backend))
+	return BACKENDS[backend]()
@@ -0,0 +1,354 @@
+# Collision - A ball dodging game
+# Copyright (C) 2016 Bruno Nova <brunomb.nova@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Spatial indexes used to find the balls that collide.
+"""
+
+import math
+
+from .bodies import Category
+
+__all__ = ["SpatialHash", "SweepAndPrune", "sweptOverlap"]
+
+# Cells checked for pairs with the balls of a cell (the other half of the
+# neighbours check this cell)
+_FORWARD_NEIGHBOURS = (0, 0), (1, 0), (-1, 1), (0, 1), (1, 1)
+
+
+def sweptOverlap(startX, startY, endX, endY, radii):
+	"""
+	Checks if two circles overlap at some moment while they move in straight lines.
+
+	The positions are relative to the other circle (the position of the first
+	circle minus the position of the second one), at the start and at the end
+	of the movement. This is the same as checking if a capsule (a segment with
+	a radius) overlaps a point.
+
+	@param startX: relative x position at the start of the movement.
+	@param startY: relative y position at the start of the movement.
+	@param endX: relative x position at the end of the movement.
+	@param endY: relative y position at the end of the movement.
+	@param radii: sum of the radii of the circles.
+	@return: whether the circles overlap at some moment.
+	"""
+	dx, dy = endX - startX, endY - startY
+	lengthSquared = dx * dx + dy * dy
+	if lengthSquared == 0:
+		t = 0
+	else:
+		# Moment of the closest approach, limited to the movement
+		t = min(max(-(startX * dx + startY * dy) / lengthSquared, 0), 1)
+	closestX = startX + dx * t
+	closestY = startY + dy * t
+	return closestX * closestX + closestY * closestY < radii * radii
+
+
+class SpatialHash:
+	"""
+	A grid of cells that indexes the balls by the cell of their centre.
+
+	Unlike Cocos' CollisionManagerGrid, the balls are kept between frames: a
+	ball is only moved to another cell when its cell changes. The size of the
+	cells is tuned to the number of balls by retune().
+	"""
+	BALLS_PER_CELL = 2  # number of balls per cell aimed at by retune()
+	RETUNE_RATIO = 1.5  # how much the ideal cell size must change to retune
+
+	def __init__(self, cellSize):
+		"""
+		Creates an empty index.
+
+		@param cellSize: size of the cells (at least the diameter of the balls).
+		"""
+		self.cellSize = cellSize
+		self.maxRadius = 0  # radius of the biggest ball added
+		self._cells = {}  # cell -> set of balls
+		self._ballCells = {}  # ball -> cell
+
+	def __len__(self):
+		return len(self._ballCells)
+
+	def __contains__(self, ball):
+		return ball in self._ballCells
+
+	def __iter__(self):
+		return iter(self._ballCells)
+
+	def add(self, ball):
+		"""
+		Adds a ball to the index.
+
+		@param ball: the ball (has x, y and radius attributes).
+		"""
+		cell = self._cellOf(ball.x, ball.y)
+		self._ballCells[ball] = cell
+		self._cells.setdefault(cell, set()).add(ball)
+		self.maxRadius = max(self.maxRadius, ball.radius)
+
+	def remove(self, ball):
+		"""Removes a ball from the index."""
+		cell = self._ballCells.pop(ball)
+		balls = self._cells[cell]
+		balls.discard(ball)
+		if not balls:
+			del self._cells[cell]
+
+	def move(self, ball, x=None, y=None):
+		"""
+		Updates the cell of a ball after it moved (does nothing if the cell is the same).
+
+		@param ball: the ball.
+		@param x: new x position of the ball (ball.x by default).
+		@param y: new y position of the ball (ball.y by default).
+		"""
+		size = self.cellSize
+		cellX = math.floor((ball.x if x is None else x) / size)
+		cellY = math.floor((ball.y if y is None else y) / size)
+		oldCell = self._ballCells[ball]
+		if cellX != oldCell[0] or cellY != oldCell[1]:  # no tuple if the same cell
+			balls = self._cells[oldCell]
+			balls.discard(ball)
+			if not balls:
+				del self._cells[oldCell]
+			cell = cellX, cellY
+			self._ballCells[ball] = cell
+			self._cells.setdefault(cell, set()).add(ball)
+
+	def query(self, x, y, radius, categories=Category.ALL):
+		"""
+		Finds the enabled balls that overlap a circle.
+
+		@param x: x position of the centre of the circle.
+		@param y: y position of the centre of the circle.
+		@param radius: radius of the circle.
+		@param categories: Category flags of the balls to find.
+		@return: list of the balls found.
+		"""
+		found = []
+		for ball in self.near(x, y, radius + self.maxRadius):
+			if ball.enabled and ball.CATEGORY & categories:
+				dx = ball.x - x
+				dy = ball.y - y
+				radii = ball.radius + radius
+				if dx * dx + dy * dy < radii * radii:
+					found.append(ball)
+		return found
+
+	def near(self, x, y, reach):
+		"""
+		Yields the balls whose centre may be within a distance of a point.
+
+		@param x: x position of the point.
+		@param y: y position of the point.
+		@param reach: the distance.
+		"""
+		size = self.cellSize
+		cells = self._cells
+		for cx in range(math.floor((x - reach) / size), math.floor((x + reach) / size) + 1):
+			for cy in range(math.floor((y - reach) / size), math.floor((y + reach) / size) + 1):
+				balls = cells.get((cx, cy))
+				if balls:
+					yield from balls
+
+	def touching(self, body, categories=Category.ALL):
+		"""
+		Finds the enabled balls that a ball is touching.
+
+		@param body: the ball (it's never included in the result).
+		@param categories: Category flags of the balls to find.
+		@return: dict with the Category of the balls found as keys, and lists
+		         of the balls as values.
+		"""
+		found = {}
+		for ball in self.query(body.x, body.y, body.radius, categories):
+			if ball is not body:
+				found.setdefault(ball.CATEGORY, []).append(ball)
+		return found
+
+	def sweep(self, body, categories=Category.ALL, margin=0):
+		"""
+		Finds the enabled balls that a ball hit while moving in the last update.
+
+		All balls moved in a straight line from (prevX, prevY) to (x, y), so fast
+		balls are not missed, like they would with a simple overlap test. The
+		motion is relative: a ball that only moved into the place the moving
+		ball left isn't hit. Only the balls in the cells near the path are
+		checked.
+
+		@param body: the moving ball (it's never included in the result).
+		@param categories: Category flags of the balls to find.
+		@param margin: maximum distance moved by the other balls.
+		@return: list of the balls found.
+		"""
+		x0, y0, x1, y1 = body.prevX, body.prevY, body.x, body.y
+		centreX, centreY = (x0 + x1) / 2, (y0 + y1) / 2
+		reach = math.hypot(x1 - x0, y1 - y0) / 2 + body.radius + self.maxRadius + margin
+
+		found = []
+		for ball in self.near(centreX, centreY, reach):
+			if ball is body or not (ball.enabled and ball.CATEGORY & categories):
+				continue
+			if sweptOverlap(x0 - ball.prevX, y0 - ball.prevY, x1 - ball.x, y1 - ball.y,
+			                body.radius + ball.radius):
+				found.append(ball)
+		return found
+
+	def pairs(self, categories=Category.ALL):
+		"""
+		Finds all pairs of enabled balls that overlap.
+
+		@param categories: Category flags of the balls to consider.
+		@return: list of the pairs (tuples of two balls) found.
+		"""
+		found = []
+		cells = self._cells
+		for (cx, cy), balls in cells.items():
+			balls = [b for b in balls if b.enabled and b.CATEGORY & categories]
+			for dx, dy in _FORWARD_NEIGHBOURS:
+				if dx == 0 and dy == 0:
+					others = balls
+				else:
+					others = cells.get((cx + dx, cy + dy))
+					if not others:
+						continue
+					others = [b for b in others if b.enabled and b.CATEGORY & categories]
+				for i, ball in enumerate(balls):
+					# In the same cell, only check each pair once
+					for other in (others[i + 1:] if others is balls else others):
+						if ball.collidesWith(other):
+							found.append((ball, other))
+		return found
+
+	def retune(self, width, height):
+		"""
+		Changes the size of the cells if the density of the balls changed enough.
+
+		The ideal size gives around BALLS_PER_CELL balls per cell, but is never
+		smaller than the diameter of the biggest ball (needed by pairs()).
+
+		@param width: width of the arena.
+		@param height: height of the arena.
+		@return: True if the cells were resized.
+		"""
+		count = max(len(self), 1)
+		ideal = math.sqrt(width * height * SpatialHash.BALLS_PER_CELL / count)
+		ideal = min(max(ideal, 2 * self.maxRadius), max(width, height))
+		ratio = ideal / self.cellSize
+		if 1 / SpatialHash.RETUNE_RATIO < ratio < SpatialHash.RETUNE_RATIO:
+			return False
+
+		balls = list(self._ballCells)
+		self.cellSize = ideal
+		self._cells.clear()
+		self._ballCells.clear()
+		for ball in balls:
+			self.add(ball)
+		return True
+
+	def _cellOf(self, x, y):
+		return math.floor(x / self.cellSize), math.floor(y / self.cellSize)
+
+
+class SweepAndPrune:
+	"""
+	A broadphase that keeps the balls sorted by their left endpoint (x - radius).
+
+	The order is kept between frames and fixed with an insertion sort, which is
+	almost linear because the balls only move a little between frames. Only the
+	balls whose left endpoint is before the right endpoint of a ball can overlap
+	it, so the sweep stops early.
+
+	It has the same methods as SpatialHash used to find pairs of balls, so it
+	can replace it in EnemyStore.bounceBalls.
+	"""
+
+	def __init__(self):
+		self._balls = []  # balls sorted by left endpoint
+		self._keys = []  # left endpoints of the balls, in the same order
+
+	def __len__(self):
+		return len(self._balls)
+
+	def __contains__(self, ball):
+		return ball in self._balls
+
+	def __iter__(self):
+		return iter(self._balls)
+
+	def add(self, ball):
+		"""Adds a ball (it's sorted in the next call to pairs())."""
+		self._balls.append(ball)
+		self._keys.append(ball.x - ball.radius)
+
+	def remove(self, ball):
+		"""Removes a ball."""
+		i = self._balls.index(ball)
+		del self._balls[i]
+		del self._keys[i]
+
+	def move(self, ball, x=None, y=None):
+		"""Does nothing: the balls are sorted by pairs()."""
+
+	def pairs(self, categories=Category.ALL):
+		"""
+		Finds all pairs of enabled balls that overlap.
+
+		@param categories: Category flags of the balls to consider.
+		@return: list of the pairs (tuples of two balls) found.
+		"""
+		self.sort()
+		balls, keys = self._balls, self._keys
+		count = len(balls)
+		found = []
+		for i, ball in enumerate(balls):
+			if not (ball.enabled and ball.CATEGORY & categories):
+				continue
+			right = ball.x + ball.radius
+			for j in range(i + 1, count):
+				if keys[j] >= right:
+					break  # the next balls start even more to the right
+				other = balls[j]
+				if other.enabled and other.CATEGORY & categories \
+				   and ball.collidesWith(other):
+					found.append((ball, other))
+		return found
+
+	def sort(self):
+		"""
+		Sorts the balls by their current left endpoint with an insertion sort.
+
+		@return: number of balls that changed place.
+		"""
+		balls, keys = self._balls, self._keys
+		for i, ball in enumerate(balls):
+			keys[i] = ball.x - ball.radius
+
+		moved = 0
+		for i in range(1, len(balls)):
+			key = keys[i]
+			if keys[i - 1] <= key:
+				continue  # already in order
+			ball = balls[i]
+			j = i - 1
+			while j >= 0 and keys[j] > key:
+				keys[j + 1] = keys[j]
+				balls[j + 1] = balls[j]
+				j -= 1
+			keys[j + 1] = key
+			balls[j + 1] = ball
+			moved += 1
+		return moved
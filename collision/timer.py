@@ -14,53 +14,125 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-class Timer:
+import heapq
+
+__all__ = ["Scheduler", "Timer"]
+
+
+class Scheduler:
 	"""
-	A timer that counts down and optionally calls a function when it reaches 0.
+	Keeps a game clock, and calls the callbacks of the timers when they reach 0.
 
-	The timer is NOT updated automatically! It must be updated manually by
-	calling the "update(dt)" method from a CocosNode's scheduled "update" method.
+	The deadlines of the running timers are kept in a heap, so advancing the
+	clock only looks at the timers that are due (and costs the same no matter
+	how many timers there are).
 
-	Also, when the timer reaches 0, it is not reset automatically! That must be
-	done manually in the callback function.
+	The scheduler is NOT advanced automatically! It must be advanced manually
+	by calling the "advance(dt)" method from a CocosNode's scheduled "update"
+	method.
 	"""
-	def __init__(self, time=0, callback=None, cond=None, *args, **kwargs):
+	def __init__(self):
+		self.clock = 0
+		"""Time (seconds) of the game clock."""
+
+		self._heap = []  # entries [deadline, number, timer] (timer is None if cancelled)
+		self._pushes = 0  # number of entries pushed (to break ties between deadlines)
+		self._timers = 0  # number of timers created (the order of the next timer)
+
+	def advance(self, dt):
 		"""
-		Creates a timer that counts down and optionally calls a function when it reaches 0.
+		Advances the clock, calling the callbacks of the timers that reach 0.
+
+		Each timer fires at most once per call. The timers that fire in the
+		same call fire in the order they were created.
+
+		@param dt: seconds passed since the last call.
+		"""
+		self.clock += dt
+		heap = self._heap
+		if not heap or heap[0][0] > self.clock:
+			return  # nothing is due
+
+		due = []
+		while heap and heap[0][0] <= self.clock:
+			deadline, number, timer = heapq.heappop(heap)
+			if timer is not None:
+				due.append((timer.order, timer))
+				timer._entry = None
+				timer._remaining = deadline - self.clock
+
+		due.sort()  # by order (unique)
+		for order, timer in due:
+			if callable(timer.callback):
+				timer.callback(timer, *timer.args, **timer.kwargs)
+
+	def _push(self, timer, deadline):
+		self._pushes += 1
+		entry = [deadline, self._pushes, timer]
+		heapq.heappush(self._heap, entry)
+		return entry
 
-		The timer is NOT updated automatically! It must be updated manually by
-		calling the "update(dt)" method from a CocosNode's scheduled "update" method.
+	def _nextOrder(self):
+		self._timers += 1
+		return self._timers
 
-		Also, when the timer reaches 0, it is not reset automatically! That must be
-		done manually in the callback function.
 
+class Timer:
+	"""
+	A timer that counts down and optionally calls a function when it reaches 0.
+
+	The timer counts down with the clock of its scheduler. When it reaches 0,
+	it is not reset automatically! That must be done manually in the callback
+	function (by setting its time).
+	"""
+	def __init__(self, scheduler, time=0, callback=None, *args, **kwargs):
+		"""
+		Creates a timer that counts down and optionally calls a function when it reaches 0.
+
+		@param scheduler: the scheduler with the clock of the timer.
 		@param time: the starting time (0 or a negative value disables the timer).
 		@param callback: function to call when the timer reaches 0. The function
 		                 receives the timer as the first argument, then "args"
 		                 and "kwargs" as optional additional arguments.
-		@param cond: optional condition (a callable) that must be met for the timer
-		             to count down.
 		@param args: optional arguments to pass to the callback function.
 		@param kwargs: optional keyword arguments to pass to the callback function.
 		"""
-		self.time = time
-		"""Time (seconds) left in the timer."""
-
+		self.scheduler = scheduler
+		self.order = scheduler._nextOrder()
 		self.callback = callback
-		self.cond = cond
 		self.args = args
 		self.kwargs = kwargs
+		self.paused = False
+		self._entry = None  # entry of the heap of the scheduler, while running
+		self._remaining = 0  # time left, while not running
+		self.time = time
 
-	def update(self, dt):
-		"""
-		Updates the timer, calling the callback function if it reaches 0.
+	@property
+	def time(self):
+		"""Time (seconds) left in the timer (0 or negative once it reached 0)."""
+		if self._entry is not None:
+			return self._entry[0] - self.scheduler.clock
+		return self._remaining
 
-		This method must be called manually for the timer to be updated!
+	@time.setter
+	def time(self, time):
+		if self._entry is not None:
+			self._entry[-1] = None  # cancel the pending deadline
+			self._entry = None
+		if time > 0 and not self.paused:
+			self._entry = self.scheduler._push(self, self.scheduler.clock + time)
+		else:
+			self._remaining = time
 
-		@param dt: seconds passed since the last update.
-		"""
-		if self.time > 0 and (not callable(self.cond) or self.cond()):
-			self.time -= dt
+	def pause(self):
+		"""Stops counting down (keeping the time left), until resume() is called."""
+		if not self.paused:
+			remaining = self.time
+			self.paused = True
+			self.time = remaining  # cancels the deadline, keeping the time
 
-			if self.time <= 0 and callable(self.callback):
-				self.callback(self, *self.args, **self.kwargs)
+	def resume(self):
+		"""Continues counting down after pause()."""
+		if self.paused:
+			self.paused = False
+			self.time = self._remaining
@@ -25,6 +25,8 @@ from pyglet.window import key
 
 from .options import Options
 
+_usableSize = [None, None]  # last real size of the window and its usable size
+
 
 def distance(x1, y1, x2, y2):
 	"""
@@ -36,7 +38,7 @@ def distance(x1, y1, x2, y2):
 	@param y2: y-coordinate of the 2nd point.
 	@return: the distance between the points.
 	"""
-	return (Vector2(x2, y2) - Vector2(x1, y1)).magnitude()
+	return math.hypot(x2 - x1, y2 - y1)
 
 def vectorFromAngle(angle, length=1):
 	"""
@@ -58,14 +60,22 @@ def getWindowUsableSize():
 	These bars are included in director.window.width, which may not be the
 	intended behavior.
 
+	The size is only computed again when the size of the window changes.
+
 	@return: a tuple with the usable size (width, height).
 	"""
+	realSize = director.window.width, director.window.height
+	if realSize != _usableSize[0]:
+		_usableSize[:] = realSize, _computeUsableSize(realSize)
+	return _usableSize[1]
+
+def _computeUsableSize(realSize):
+	"""Computes the usable size of the window (see getWindowUsableSize())."""
 	# Original and virtual window size and aspect ratio
 	virtualSize = director.get_window_size()
 	virtualRatio = virtualSize[0] / virtualSize[1]
 
 	# Real window size and aspect ration
-	realSize = director.window.width, director.window.height
 	realRatio = realSize[0] / realSize[1]
 
 	# Determine the usable size
@@ -26,4 +26,5 @@ setup(
 	package_data = {"collision": ["res/*", "mo/*/*/*.mo"]},
 	scripts = ["bin/collision"],
 	install_requires = ["cocos2d"],
+	extras_require = {"fast": ["numpy"], "jit": ["numpy", "numba"]},
 )